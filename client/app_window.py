@@ -1,47 +1,12 @@
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QStackedWidget, QApplication
-from PySide6.QtGui import QIcon
-import os
-import socket
-import json
-import struct
 
 from auth_window import AuthWindow
 from register_window import RegisterWindow
-from ui.main_window import MainWindow
 from config import load_config, save_config, clear_config
 from user_context import UserContext
+from network import connect_tcp, send_json_packet, recv_json_packet
 from settings import get_api_endpoint
-
-
-def _recv_exact(sock: socket.socket, n: int) -> bytes:
-    buf = b""
-    while len(buf) < n:
-        chunk = sock.recv(n - len(buf))
-        if not chunk:
-            return b""
-        buf += chunk
-    return buf
-
-
-def _send_packet(sock: socket.socket, obj: dict) -> None:
-    payload = json.dumps(obj, ensure_ascii=False).encode("utf-8")
-    sock.sendall(struct.pack("!I", len(payload)) + payload)
-
-
-def _recv_packet(sock: socket.socket, max_bytes: int = 2_000_000) -> dict:
-    hdr = _recv_exact(sock, 4)
-    if not hdr:
-        return {}
-    length = struct.unpack("!I", hdr)[0]
-    if length <= 0 or length > max_bytes:
-        return {}
-    body = _recv_exact(sock, length)
-    if not body:
-        return {}
-    try:
-        return json.loads(body.decode("utf-8"))
-    except Exception:
-        return {}
+from style_manager import get_app_icon
 
 
 class AppWindow(QWidget):
@@ -56,9 +21,9 @@ class AppWindow(QWidget):
         self.setMinimumSize(1120, 620)
 
         # Иконка
-        icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons", "app_icon.png")
-        if os.path.exists(icon_path):
-            self.setWindowIcon(QIcon(icon_path))
+        icon = get_app_icon()
+        if icon is not None:
+            self.setWindowIcon(icon)
 
         self.ctx = UserContext()
 
@@ -112,6 +77,7 @@ class AppWindow(QWidget):
                 "avatar": avatar,
                 "token": token,
                 "token_expires_at": expires_at,
+                "last_avatar_dir": cfg.get("last_avatar_dir", ""),
                 # при желании можно переопределить endpoints: api_host/api_port/voice_host/voice_port
             })
             self.show_main()
@@ -130,16 +96,17 @@ class AppWindow(QWidget):
         """
         host, port = get_api_endpoint()
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(1.5)
-                s.connect((host, int(port)))
-                _send_packet(s, {"action": "resume_session", "token": token})
-                return _recv_packet(s)
+            with connect_tcp(host, port, 1.5) as s:
+                send_json_packet(s, {"action": "resume_session", "token": token})
+                return recv_json_packet(s) or {}
         except Exception:
             return {}
 
     def _ensure_main_page(self):
         if self.main_page is None:
+            # Граф главного окна (страницы, push/API-клиенты) грузится только
+            # после авторизации, а не на старте с экраном логина.
+            from ui.main_window import MainWindow
             self.main_page = MainWindow(controller=self)
             self.stack.addWidget(self.main_page)
 
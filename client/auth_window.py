@@ -1,6 +1,6 @@
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QLineEdit, QPushButton, QLabel, QMessageBox
 from network import NetworkThread
-from config import save_config
+from config import load_config, save_config
 from user_context import UserContext
 from settings import get_api_endpoint
 
@@ -66,7 +66,10 @@ class AuthWindow(QWidget):
             expires_at = resp.get("expires_at", "")
 
             self.ctx.set_user(login=login, nickname=nickname, avatar=avatar, session_token=token, token_expires_at=expires_at)
-            save_config({"login": login, "nickname": nickname, "avatar": avatar, "token": token, "token_expires_at": expires_at})
+            # Дописываем поверх конфига, чтобы не терять настройки устройства (last_avatar_dir и т.п.).
+            cfg = load_config()
+            cfg.update({"login": login, "nickname": nickname, "avatar": avatar, "token": token, "token_expires_at": expires_at})
+            save_config(cfg)
 
             self.password.clear()
 
@@ -1,12 +1,19 @@
 import json
 import os
-import shutil
 from typing import Any, Dict
 
 
 APP_NAME = "Nodys"
 LEGACY_CONFIG_FILE = "config.json"  # старое расположение (cwd)
 
+# Последний прочитанный/записанный конфиг: (path, (mtime_ns, size), data).
+# Файл меняет только этот модуль, поэтому повторные load_config берут копию
+# отсюда, пока stat файла не изменился.
+_cache = None
+
+# Настройки устройства, а не сессии: переживают clear_config() при logout.
+PERSISTENT_KEYS = ("last_avatar_dir",)
+
 
 def _get_user_config_dir() -> str:
     """Папка настроек пользователя (кросс‑платформенно)."""
@@ -36,6 +43,7 @@ def _migrate_legacy_config_if_needed() -> None:
             return
         if os.path.exists(LEGACY_CONFIG_FILE):
             # Если файл уже рядом — переносим
+            import shutil
             os.makedirs(os.path.dirname(new_path), exist_ok=True)
             shutil.copy2(LEGACY_CONFIG_FILE, new_path)
             # старый не удаляем насильно (на всякий случай)
@@ -56,21 +64,45 @@ def load_config() -> Dict[str, Any]:
                 return {}
         return {}
 
+    global _cache
+    stamp = _file_stamp(path)
+    if _cache is not None and _cache[0] == path and _cache[1] == stamp:
+        return dict(_cache[2])
     try:
         with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+            data = json.load(f)
     except Exception:
         return {}
+    if isinstance(data, dict):
+        _cache = (path, stamp, dict(data))
+    return data
+
+
+def _file_stamp(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
 
 
 def save_config(data: Dict[str, Any]) -> None:
+    global _cache
     path = get_config_path()
+    # Те же данные уже на диске (файл не менялся после нашего чтения/записи) — не пишем.
+    if _cache is not None and _cache[0] == path and _cache[2] == data and _cache[1] == _file_stamp(path):
+        return
     os.makedirs(os.path.dirname(path), exist_ok=True)
+    _cache = None
     with open(path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=4)
+    _cache = (path, _file_stamp(path), dict(data))
 
 
 def clear_config() -> None:
+    global _cache
+    keep = {k: v for k, v in load_config().items() if k in PERSISTENT_KEYS and v}
+    _cache = None
     # Удаляем и новый, и legacy-конфиг, чтобы авто-логин не восстанавливался из старого файла.
     for path in (get_config_path(), LEGACY_CONFIG_FILE):
         try:
@@ -78,3 +110,8 @@ def clear_config() -> None:
                 os.remove(path)
         except Exception:
             pass
+    if keep:
+        try:
+            save_config(keep)
+        except Exception:
+            pass
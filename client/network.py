@@ -1,5 +1,6 @@
 import socket
 import json
+import queue
 import threading
 import struct
 import time
@@ -10,7 +11,7 @@ from typing import Optional, Dict, Any
 from PySide6.QtCore import QObject, Signal
 
 from user_context import UserContext
-from settings import get_api_endpoint
+from settings import get_api_endpoint, resolve_sockaddr
 
 
 # Actions that require a valid session token.
@@ -30,12 +31,16 @@ AUTH_ACTIONS = {
     "get_unread_counts",
     "call_user",
     "poll_events",
+    "poll_events_long",
     "accept_call",
     "decline_call",
     "end_call",
     "release_call_state",
     "presence_offline",
+    "shutdown_bundle",
     "heartbeat",
+    "poll_batch",
+    "subscribe",
     "find_user",
     "resume_session",  # token-only
     "create_channel",
@@ -90,11 +95,13 @@ NO_RETRY_ACTIONS = {
 # Идемпотентные state-update действия: можно повторять аккуратно.
 STATEFUL_RETRY_ACTIONS = {
     "heartbeat",
+    "poll_batch",
     "status",
     "check_online",
     "resume_session",
     "release_call_state",
     "presence_offline",
+    "shutdown_bundle",
     "set_channel_voice_presence",
     "leave_channel_voice",
     "mark_chat_read",
@@ -152,18 +159,77 @@ def _is_retryable_error(payload: dict) -> bool:
     )
 
 
+def _is_unknown_action_error(payload: dict) -> bool:
+    """Ответ сервера, который не знает запрошенный action (старые версии без code)."""
+    p = payload or {}
+    if p.get("code") == "unknown_action":
+        return True
+    return str(p.get("message", "")).strip().lower() == "неизвестное действие"
+
+
 def _recv_exact(sock: socket.socket, n: int) -> bytes:
-    buf = b""
-    while len(buf) < n:
-        chunk = sock.recv(n - len(buf))
-        if not chunk:
+    # Один буфер на сообщение: без копирования накопленного на каждом recv.
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if not k:
             return b""
-        buf += chunk
-    return buf
+        got += k
+    return bytes(buf)
+
+
+_TCP_QUICKACK = getattr(socket, "TCP_QUICKACK", None)
+
+
+def _rearm_quickack(sock: socket.socket) -> None:
+    """Linux only: ACK the next segment immediately instead of via delayed ACK.
+
+    The kernel clears the flag on its own, so it is re-armed after every frame.
+    """
+    if _TCP_QUICKACK is None:
+        return
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, _TCP_QUICKACK, 1)
+    except OSError:
+        pass
+
+
+def _idle_socket_unusable(s: socket.socket) -> bool:
+    """Проверка keep-alive сокета перед повторным использованием (без блокировки).
+
+    Живой простаивающий сокет не должен иметь входящих данных:
+    b"" — сервер закрыл соединение, любые байты — рассинхронизация.
+    Оставляет сокет в неблокирующем режиме — вызывающий потом делает settimeout().
+    """
+    try:
+        s.setblocking(False)
+        try:
+            s.recv(1, socket.MSG_PEEK)
+            return True
+        except BlockingIOError:
+            return False
+    except OSError:
+        return True
+
+
+def connect_tcp(host: str, port: int, timeout_sec: float) -> socket.socket:
+    """Connected TCP socket for JSON RPC: bounded connect, Nagle disabled.
+
+    Requests are single small frames, so they must not wait for a delayed ACK.
+    """
+    s = socket.create_connection(resolve_sockaddr(host, port), timeout=timeout_sec)
+    try:
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+        pass
+    _rearm_quickack(s)
+    return s
 
 
 def send_json_packet(sock: socket.socket, obj: Dict[str, Any]) -> None:
-    payload = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    payload = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
     sock.sendall(struct.pack("!I", len(payload)) + payload)
 
 
@@ -198,6 +264,7 @@ def recv_json_packet(sock: socket.socket, max_bytes: int = 10_000_000) -> Option
     if length <= 0 or length > max_bytes:
         return None
     payload = _recv_exact(sock, length)
+    _rearm_quickack(sock)
     if not payload:
         return None
     try:
@@ -206,8 +273,73 @@ def recv_json_packet(sock: socket.socket, max_bytes: int = 10_000_000) -> Option
         return None
 
 
+def prepare_payload(data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    obj = dict(data or {})
+    action = obj.get("action")
+    ctx = UserContext()
+
+    if action in AUTH_ACTIONS:
+        token = getattr(ctx, "session_token", "")
+        if token and "token" not in obj:
+            obj["token"] = token
+
+        # ВАЖНО:
+        # Не перезаписываем явные login/from_user из payload.
+        # Для accept/decline (дружба/звонок) поле from_user означает
+        # ИСТОЧНИКА запроса/звонка, и подмена ломает логику.
+        # Добавляем только отсутствующие поля для совместимости.
+        if "login" not in obj and getattr(ctx, "login", ""):
+            obj["login"] = ctx.login
+
+        if action in {"send_friend_request", "send_message", "call_user", "get_messages"}:
+            if "from_user" not in obj and getattr(ctx, "login", ""):
+                obj["from_user"] = ctx.login
+
+    return obj
+
+
+class _RequestPool:
+    """Bounded set of reusable worker threads for NetworkThread jobs.
+
+    Workers are spawned on demand up to MAX_WORKERS and then kept; further
+    jobs wait in the queue instead of starting a thread per request.
+    """
+
+    MAX_WORKERS = 4
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._workers = 0
+        self._idle = 0
+
+    def submit(self, fn):
+        with self._lock:
+            spawn = self._idle == 0 and self._workers < self.MAX_WORKERS
+            if spawn:
+                self._workers += 1
+        self._queue.put(fn)
+        if spawn:
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+            fn = self._queue.get()
+            with self._lock:
+                self._idle -= 1
+            try:
+                fn()
+            except Exception:
+                pass
+
+
+_REQUEST_POOL = _RequestPool()
+
+
 class NetworkThread(QObject):
-    """Threaded one-shot network request.
+    """One-shot network request executed on the shared request pool.
 
     Drop-in replacement for older QThread-based logic.
     """
@@ -221,24 +353,23 @@ class NetworkThread(QObject):
         self.data = data
 
         self._abort_event = threading.Event()
-        self._thread = None
+        # Set while not queued/running: wait() before start() returns at once.
+        self._done_event = threading.Event()
+        self._done_event.set()
 
     # ---------------- compatibility API ----------------
     def start(self):
-        if self._thread and self._thread.is_alive():
+        if self.isRunning():
             return
-        self._thread = threading.Thread(target=self._run, daemon=True)
-        self._thread.start()
+        self._done_event.clear()
+        _REQUEST_POOL.submit(self._run_job)
 
     def isRunning(self):
-        return self._thread is not None and self._thread.is_alive()
+        return not self._done_event.is_set()
 
     def wait(self, ms=0):
-        if not self._thread:
-            return True
         timeout = None if ms is None or ms <= 0 else ms / 1000.0
-        self._thread.join(timeout=timeout)
-        return not self._thread.is_alive()
+        return self._done_event.wait(timeout)
 
     def abort(self):
         self._abort_event.set()
@@ -250,33 +381,18 @@ class NetworkThread(QObject):
         self.abort()
 
     # ---------------- internal ----------------
+    def _run_job(self):
+        try:
+            self._run()
+        finally:
+            self._done_event.set()
+
     def _emit_if_alive(self, payload: dict):
         if not self._abort_event.is_set():
             self.finished.emit(payload)
 
     def _prepare_payload(self) -> Dict[str, Any]:
-        obj = dict(self.data or {})
-        action = obj.get("action")
-        ctx = UserContext()
-
-        if action in AUTH_ACTIONS:
-            token = getattr(ctx, "session_token", "")
-            if token and "token" not in obj:
-                obj["token"] = token
-
-            # ВАЖНО:
-            # Не перезаписываем явные login/from_user из payload.
-            # Для accept/decline (дружба/звонок) поле from_user означает
-            # ИСТОЧНИКА запроса/звонка, и подмена ломает логику.
-            # Добавляем только отсутствующие поля для совместимости.
-            if "login" not in obj and getattr(ctx, "login", ""):
-                obj["login"] = ctx.login
-
-            if action in {"send_friend_request", "send_message", "call_user", "get_messages"}:
-                if "from_user" not in obj and getattr(ctx, "login", ""):
-                    obj["from_user"] = ctx.login
-
-        return obj
+        return prepare_payload(self.data)
 
     def _sleep_abortable(self, sec: float):
         left = max(0.0, float(sec))
@@ -305,9 +421,7 @@ class NetworkThread(QObject):
                 if self._abort_event.is_set():
                     return
                 try:
-                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                        s.settimeout(3.0)
-                        s.connect((host, int(port)))
+                    with connect_tcp(host, port, 3.0) as s:
                         if self._abort_event.is_set():
                             return
 
@@ -375,3 +489,535 @@ class NetworkThread(QObject):
             self._emit_if_alive({"status": "error", "message": f"Ошибка сокета: {e}"})
         except Exception as e:
             self._emit_if_alive({"status": "error", "message": f"Ошибка сети: {e}"})
+
+
+class ApiRequest:
+    """Handle of a request queued on ApiWorker.
+
+    Mirrors the NetworkThread control API (isRunning/wait/abort), so call
+    sites keep their in-flight checks and teardown code unchanged.
+    """
+
+    def __init__(self, data: Dict[str, Any], callback=None):
+        self.data = data
+        self.callback = callback
+        self._abort_event = threading.Event()
+        self._done_event = threading.Event()
+
+    def isRunning(self):
+        return not self._done_event.is_set()
+
+    def wait(self, ms=0):
+        timeout = None if ms is None or ms <= 0 else ms / 1000.0
+        return self._done_event.wait(timeout)
+
+    def abort(self):
+        self._abort_event.set()
+
+    def requestInterruption(self):
+        self.abort()
+
+    def quit(self):
+        self.abort()
+
+
+class ApiWorker(QObject):
+    """One worker thread with one persistent keep-alive socket.
+
+    Requests are executed in submission order; the callback is invoked on
+    the Qt thread that owns the worker. Unlike NetworkThread there is no
+    thread spawn or TCP handshake per request.
+
+    Requests queued at the same time are pipelined: written back to back
+    with a req_id each, then the replies are read and matched by req_id,
+    so a burst costs one round trip instead of one per request.
+    """
+
+    _response_ready = Signal(object, dict)
+
+    SOCKET_TIMEOUT_SEC = 3.0
+    # Закрываем простаивающий сокет раньше серверного REQUEST_KEEPALIVE_IDLE_SEC,
+    # чтобы не отправить запрос в уже закрытое сервером соединение.
+    IDLE_CLOSE_SEC = 45.0
+    PIPELINE_MAX = 16
+
+    def __init__(self):
+        super().__init__()
+        self._queue = queue.SimpleQueue()
+        self._req_seq = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._sock = None
+        self._sock_addr = None
+        self._sock_lock = threading.Lock()
+        self._response_ready.connect(self._deliver)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def isRunning(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, data: Dict[str, Any], callback=None) -> ApiRequest:
+        req = ApiRequest(data, callback)
+        self.start()
+        self._queue.put(req)
+        return req
+
+    def stop(self):
+        self._stop_event.set()
+        self._queue.put(None)
+        with self._sock_lock:
+            s = self._sock
+        if s is not None:
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    # ---------------- internal ----------------
+    def _deliver(self, req: ApiRequest, resp: dict):
+        # Отдаём замыкание вместе с ответом: handle, который ещё держит
+        # вызывающий код, не должен удерживать захваченные объекты.
+        callback, req.callback = req.callback, None
+        if req._abort_event.is_set() or callback is None:
+            return
+        callback(resp)
+
+    def _close_socket(self):
+        with self._sock_lock:
+            s, self._sock = self._sock, None
+        if s is not None:
+            try:
+                s.close()
+            except OSError:
+                pass
+
+    def _ensure_socket(self) -> socket.socket:
+        host, port = get_api_endpoint()
+        addr = (host, int(port))
+        # Сервер закрывает keep-alive после ошибки обработчика, рестарта или
+        # простоя: запрос в такой сокет теряется, а NO_RETRY-действия не повторяются.
+        if self._sock is not None and (self._sock_addr != addr or _idle_socket_unusable(self._sock)):
+            self._close_socket()
+        if self._sock is None:
+            s = connect_tcp(host, port, self.SOCKET_TIMEOUT_SEC)
+            with self._sock_lock:
+                self._sock = s
+            self._sock_addr = addr
+        self._sock.settimeout(self.SOCKET_TIMEOUT_SEC)
+        return self._sock
+
+    def _perform(self, req: ApiRequest) -> Optional[dict]:
+        payload_obj = prepare_payload(req.data)
+        payload_obj["keep_alive"] = True
+        policy = retry_policy_for_action(str(payload_obj.get("action") or "").strip())
+        max_attempts = max(1, int(policy.max_attempts))
+
+        last_err = None
+        for attempt in range(1, max_attempts + 1):
+            if req._abort_event.is_set() or self._stop_event.is_set():
+                return None
+            try:
+                s = self._ensure_socket()
+                send_json_packet(s, payload_obj)
+                obj = recv_json_packet(s)
+                if obj:
+                    return obj
+                last_err = {"status": "error", "message": "Пустой или некорректный ответ от сервера"}
+            except socket.timeout:
+                last_err = {"status": "error", "message": "Таймаут сети"}
+            except ConnectionRefusedError:
+                last_err = {"status": "error", "message": "Сервер не запущен"}
+            except OSError as e:
+                last_err = {"status": "error", "message": f"Ошибка сокета: {e}"}
+            except Exception as e:
+                self._close_socket()
+                return {"status": "error", "message": f"Ошибка сети: {e}"}
+
+            # После ошибки поток ответов рассинхронизирован — только новое соединение.
+            self._close_socket()
+            if attempt < max_attempts and _is_retryable_error(last_err):
+                delay = min(policy.base_delay * (2 ** (attempt - 1)), policy.max_delay)
+                if policy.jitter > 0:
+                    delay += random.uniform(0.0, policy.jitter)
+                self._stop_event.wait(delay)
+                continue
+            break
+        return last_err
+
+    def _perform_pipelined(self, reqs) -> Dict[int, Any]:
+        """Write all requests, then read their replies; {id(req): reply}.
+
+        A request that was written but got no reply maps to False: it may
+        have been executed, so only actions with a retry policy are resent.
+        Requests missing from the result were never written.
+        """
+        by_id = {}
+        payloads = []
+        for req in reqs:
+            self._req_seq += 1
+            payload_obj = prepare_payload(req.data)
+            payload_obj["keep_alive"] = True
+            payload_obj["req_id"] = self._req_seq
+            by_id[self._req_seq] = req
+            payloads.append(payload_obj)
+
+        results: Dict[int, Any] = {}
+        sent = 0
+        try:
+            s = self._ensure_socket()
+            for payload_obj in payloads:
+                send_json_packet(s, payload_obj)
+                results[id(by_id[payload_obj["req_id"]])] = False
+                sent += 1
+            for i in range(sent):
+                obj = recv_json_packet(s)
+                if not obj:
+                    raise OSError("empty reply")
+                # Сервер без req_id отвечает строго по порядку.
+                rid = obj.pop("req_id", payloads[i]["req_id"])
+                req = by_id.get(rid)
+                if req is None:
+                    raise OSError("unexpected req_id")
+                results[id(req)] = obj
+        except Exception:
+            self._close_socket()
+        return results
+
+    def _finish(self, req: ApiRequest, resp: Optional[dict]):
+        delivered = False
+        try:
+            if resp is not None and not req._abort_event.is_set() and not self._stop_event.is_set():
+                self._response_ready.emit(req, resp)
+                delivered = True
+        finally:
+            if not delivered:
+                req.callback = None
+            req._done_event.set()
+
+    def _process_batch(self, batch):
+        live = [r for r in batch if not r._abort_event.is_set()]
+        pipelined = self._perform_pipelined(live) if len(live) > 1 else {}
+        for req in batch:
+            resp = None
+            try:
+                if req._abort_event.is_set():
+                    continue
+                got = pipelined.get(id(req))
+                if got:
+                    resp = got
+                elif got is False and retry_policy_for_action(str(req.data.get("action") or "")).max_attempts <= 1:
+                    resp = {"status": "error", "message": "Ошибка сокета: соединение прервано"}
+                else:
+                    resp = self._perform(req)
+            finally:
+                self._finish(req, resp)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                req = self._queue.get(timeout=self.IDLE_CLOSE_SEC)
+            except queue.Empty:
+                self._close_socket()
+                continue
+            if req is None:
+                break
+            batch = [req]
+            stop_after = False
+            while len(batch) < self.PIPELINE_MAX:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop_after = True
+                    break
+                batch.append(nxt)
+            self._process_batch(batch)
+            if stop_after:
+                break
+
+        self._close_socket()
+        # Незапущенные запросы больше не выполнятся — не держим их "в полёте".
+        while True:
+            try:
+                req = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if req is not None:
+                req.callback = None
+                req._done_event.set()
+
+
+class ControlChannel:
+    """Synchronous keep-alive connection for short best-effort control RPCs.
+
+    Used on logout/close paths (release_call_state, presence_offline, logout)
+    that run back to back: the socket is opened once and reused, and several
+    requests can be pipelined so they complete in one round trip.
+
+    notify() sends without waiting for the reply; replies left unread are
+    drained before the next request() on the same socket.
+    """
+
+    # Раньше серверного REQUEST_KEEPALIVE_IDLE_SEC: не пишем в закрытый сервером сокет.
+    IDLE_MAX_SEC = 45.0
+
+    def __init__(self):
+        self._sock = None
+        self._sock_addr = None
+        self._last_used = 0.0
+        self._unread_replies = 0
+        self._lock = threading.Lock()
+
+    def notify(self, payload: Dict[str, Any], timeout_sec: float) -> bool:
+        """Fire-and-forget: send one request and return without its reply.
+
+        The server handles the request to completion regardless; only the
+        send is bounded by timeout_sec. Returns False if nothing was sent.
+        """
+        payload = dict(payload, keep_alive=True)
+        with self._lock:
+            for _ in range(2):
+                reused = self._sock is not None
+                try:
+                    s = self._ensure_socket(timeout_sec)
+                    send_json_packet(s, payload)
+                except OSError:
+                    self._close_socket()
+                    if not reused:
+                        break
+                    continue
+                self._unread_replies += 1
+                self._last_used = time.monotonic()
+                return True
+        return False
+
+    def request(self, payload: Dict[str, Any], timeout_sec: float) -> Optional[Dict[str, Any]]:
+        return self.pipeline([payload], timeout_sec)[0]
+
+    def pipeline(self, payloads, timeout_sec: float) -> list:
+        """Send all payloads back to back, then read the replies in order.
+
+        Control actions are idempotent, so a failure on a reused socket is
+        retried once on a fresh connection.
+        """
+        payloads = [dict(p, keep_alive=True) for p in payloads]
+        with self._lock:
+            for _ in range(2):
+                reused = self._sock is not None
+                try:
+                    s = self._ensure_socket(timeout_sec)
+                    self._drain_replies(s)
+                    for p in payloads:
+                        send_json_packet(s, p)
+                    replies = [recv_json_packet(s) for _ in payloads]
+                except OSError:
+                    replies = None
+                if replies is not None and all(r is not None for r in replies):
+                    self._last_used = time.monotonic()
+                    return replies
+                self._close_socket()
+                if not reused:
+                    break
+        return [None] * len(payloads)
+
+    def close(self):
+        with self._lock:
+            self._close_socket()
+
+    # ---------------- internal ----------------
+    def _drain_replies(self, s: socket.socket):
+        while self._unread_replies > 0:
+            if recv_json_packet(s) is None:
+                raise OSError("control channel desynchronized")
+            self._unread_replies -= 1
+
+    def _close_socket(self):
+        s, self._sock = self._sock, None
+        unread, self._unread_replies = self._unread_replies, 0
+        if s is None:
+            return
+        try:
+            if unread:
+                # Непрочитанные данные в приёмном буфере превращают close() в RST,
+                # а RST может сбросить ещё не прочитанный сервером notify().
+                s.setblocking(False)
+                try:
+                    while s.recv(65536):
+                        pass
+                except OSError:
+                    pass
+            # FIN сразу за последним запросом: сервер дочитает его и завершит keep-alive цикл.
+            s.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        try:
+            s.close()
+        except OSError:
+            pass
+
+    def _is_stale(self, s: socket.socket) -> bool:
+        if time.monotonic() - self._last_used > self.IDLE_MAX_SEC:
+            return True
+        if self._unread_replies:
+            # Входящие байты ожидаемы — это ответы на notify(); PEEK ничего не скажет.
+            return False
+        return _idle_socket_unusable(s)
+
+    def _ensure_socket(self, timeout_sec: float) -> socket.socket:
+        host, port = get_api_endpoint()
+        addr = (host, int(port))
+        if self._sock is not None and (self._sock_addr != addr or self._is_stale(self._sock)):
+            self._close_socket()
+        if self._sock is None:
+            s = connect_tcp(host, port, max(0.2, float(timeout_sec)))
+            try:
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            except OSError:
+                pass
+            self._sock = s
+            self._sock_addr = addr
+        self._sock.settimeout(max(0.2, float(timeout_sec)))
+        return self._sock
+
+
+class PushClient(QObject):
+    """Persistent server-push subscription (action "subscribe").
+
+    One long-lived TCP connection replaces fixed-interval event polling: the
+    server writes event frames as they happen plus periodic pings. On any
+    socket error the client reconnects with backoff; ``connection_changed``
+    lets the owner fall back to polling while the channel is down.
+
+    A server that rejects "subscribe" is served over the same dedicated
+    socket with poll_events_long: each request returns as soon as events
+    arrive or after LONG_POLL_WAIT_MS.
+    """
+
+    event_received = Signal(dict)
+    connection_changed = Signal(bool)
+
+    RECV_TIMEOUT_SEC = 30.0
+    RECONNECT_BASE_DELAY = 1.0
+    RECONNECT_MAX_DELAY = 15.0
+    LONG_POLL_WAIT_MS = 20000
+
+    def __init__(self, login: str, token: str):
+        super().__init__()
+        self.login = login or ""
+        self.token = token or ""
+
+        self._abort_event = threading.Event()
+        self._thread = None
+        self._sock = None
+        self._sock_lock = threading.Lock()
+        self._long_poll = False
+        self.connected = False
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def isRunning(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self._abort_event.set()
+        with self._sock_lock:
+            s = self._sock
+        if s is not None:
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    # ---------------- internal ----------------
+    def _long_poll_frames(self, s: socket.socket):
+        while not self._abort_event.is_set():
+            send_json_packet(s, {
+                "action": "poll_events_long",
+                "login": self.login,
+                "token": self.token,
+                "max_wait_ms": self.LONG_POLL_WAIT_MS,
+                "keep_alive": True,
+            })
+            frame = recv_json_packet(s)
+            if not frame:
+                return
+            yield frame
+
+    def _set_connected(self, value: bool):
+        if self.connected == value:
+            return
+        self.connected = value
+        if not self._abort_event.is_set():
+            self.connection_changed.emit(value)
+
+    def _sleep_abortable(self, sec: float):
+        self._abort_event.wait(max(0.0, float(sec)))
+
+    def _run(self):
+        delay = self.RECONNECT_BASE_DELAY
+        while not self._abort_event.is_set():
+            try:
+                host, port = get_api_endpoint()
+                with connect_tcp(host, port, 3.0) as s:
+                    with self._sock_lock:
+                        self._sock = s
+                    if self._abort_event.is_set():
+                        return
+
+                    s.settimeout(self.RECV_TIMEOUT_SEC)
+                    if self._long_poll:
+                        frames = self._long_poll_frames(s)
+                    else:
+                        send_json_packet(s, {
+                            "action": "subscribe",
+                            "login": self.login,
+                            "token": self.token,
+                        })
+                        hello = recv_json_packet(s)
+                        if not hello or hello.get("status") != "ok":
+                            if hello and hello.get("code") == "session_invalid":
+                                return
+                            if _is_unknown_action_error(hello):
+                                # Сервер без subscribe: дальше long-poll.
+                                self._long_poll = True
+                            raise OSError("subscribe rejected")
+                        frames = iter(lambda: recv_json_packet(s), None)
+                        self._set_connected(True)
+                        delay = self.RECONNECT_BASE_DELAY
+
+                    for frame in frames:
+                        if self._abort_event.is_set():
+                            return
+                        if frame.get("status") != "ok":
+                            if frame.get("code") == "session_invalid":
+                                return
+                            break
+                        if not self.connected:
+                            # long-poll: соединение живо только после первого ok-ответа
+                            self._set_connected(True)
+                            delay = self.RECONNECT_BASE_DELAY
+                        for ev in frame.get("events") or []:
+                            if self._abort_event.is_set():
+                                return
+                            if isinstance(ev, dict):
+                                self.event_received.emit(ev)
+            except (OSError, ValueError):
+                pass
+            finally:
+                with self._sock_lock:
+                    self._sock = None
+                self._set_connected(False)
+
+            self._sleep_abortable(delay + random.uniform(0.0, 0.3))
+            delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
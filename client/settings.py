@@ -5,7 +5,9 @@ All values are overridable via config.json saved in the user's config directory.
 
 from __future__ import annotations
 
-from typing import Tuple
+import socket
+import time
+from typing import Dict, Tuple
 
 from config import load_config
 
@@ -16,7 +18,16 @@ DEFAULT_VOICE_HOST = "127.0.0.1"
 DEFAULT_VOICE_PORT = 5556
 
 
+# Результат getaddrinfo держим в памяти с коротким TTL, чтобы не резолвить
+# хост на каждый запрос. Ключ — (host, port), так что смена endpoint в
+# config.json сразу даёт новый lookup.
+SOCKADDR_CACHE_TTL_SEC = 60.0
+
+_sockaddr_cache: Dict[Tuple[str, int], Tuple[float, Tuple[str, int]]] = {}
+
+
 def get_api_endpoint() -> Tuple[str, int]:
+    # load_config() — снимок с проверкой stat, отдельный кэш не нужен.
     cfg = load_config()
     host = cfg.get("api_host", DEFAULT_API_HOST)
     port = int(cfg.get("api_port", DEFAULT_API_PORT))
@@ -28,3 +39,19 @@ def get_voice_endpoint() -> Tuple[str, int]:
     host = cfg.get("voice_host", DEFAULT_VOICE_HOST)
     port = int(cfg.get("voice_port", DEFAULT_VOICE_PORT))
     return host, port
+
+
+def resolve_sockaddr(host: str, port: int) -> Tuple[str, int]:
+    """IPv4 sockaddr for connect() without a DNS lookup on every request."""
+    key = (host, int(port))
+    now = time.monotonic()
+    hit = _sockaddr_cache.get(key)
+    if hit is not None and now - hit[0] < SOCKADDR_CACHE_TTL_SEC:
+        return hit[1]
+    try:
+        addr = socket.getaddrinfo(host, int(port), socket.AF_INET, socket.SOCK_STREAM)[0][4][:2]
+    except OSError:
+        # Не кэшируем неудачу: connect() сам вернёт понятную ошибку.
+        return key
+    _sockaddr_cache[key] = (now, addr)
+    return addr
@@ -1,5 +1,11 @@
 import os
 
+from PySide6.QtGui import QIcon
+
+
+_ICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons", "app_icon.png")
+_icon = None
+
 
 def _read_file(path: str) -> str:
     if not os.path.exists(path):
@@ -22,3 +28,15 @@ def apply_app_styles(app, *names: str):
 
 def apply_widget_styles(widget, *names: str):
     widget.setStyleSheet(load_styles(*names))
+
+
+def get_app_icon():
+    """Иконка приложения: один QIcon на процесс для всех окон (None, если файла нет).
+
+    Создаётся при первом запросе, а не на импорте: QApplication к этому
+    моменту уже существует.
+    """
+    global _icon
+    if _icon is None and os.path.exists(_ICON_PATH):
+        _icon = QIcon(_ICON_PATH)
+    return _icon
@@ -1,7 +1,179 @@
 import os
+import queue
+import threading
+import weakref
+
 from PySide6.QtWidgets import QLabel
-from PySide6.QtGui import QPixmap, QPainter, QPainterPath, QColor, QFont
-from PySide6.QtCore import Qt
+from PySide6.QtGui import QPixmap, QPixmapCache, QImage, QImageReader, QPainter, QPainterPath, QColor, QFont
+from PySide6.QtCore import Qt, QObject, QSize, Signal
+
+
+# client/ui/avatar_widget.py -> client
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AVATARS_DIR = os.path.join(CLIENT_DIR, "avatars")
+_AVATAR_EXTS = (".png", ".jpg", ".jpeg")
+# (mtime_ns каталога avatars, имена файлов в normcase)
+_avatar_index = (None, frozenset())
+
+
+def find_local_avatar(login: str) -> str:
+    """Относительный путь avatars/<login>.<ext> или "", если файла нет.
+
+    Вместо stat на каждое расширение — один stat каталога: список имён
+    перечитывается (scandir) только когда меняется mtime каталога.
+    """
+    global _avatar_index
+    if not login:
+        return ""
+    try:
+        mtime = os.stat(AVATARS_DIR).st_mtime_ns
+    except OSError:
+        return ""
+    if _avatar_index[0] != mtime:
+        try:
+            with os.scandir(AVATARS_DIR) as it:
+                names = frozenset(os.path.normcase(e.name) for e in it)
+        except OSError:
+            names = frozenset()
+        _avatar_index = (mtime, names)
+    names = _avatar_index[1]
+    for ext in _AVATAR_EXTS:
+        name = f"{login}{ext}"
+        if os.path.normcase(name) in names:
+            return f"avatars/{name}"
+    return ""
+
+
+def _resolve_avatar_file(path: str, login: str) -> str:
+    # 1) Прямой путь
+    if path and os.path.exists(path):
+        return path
+    # 2) Относительный путь от client
+    if path and not os.path.isabs(path):
+        p2 = os.path.join(CLIENT_DIR, path)
+        if os.path.exists(p2):
+            return p2
+    # 3) fallback avatars/<login>.<ext>
+    rel = find_local_avatar(login)
+    return os.path.join(CLIENT_DIR, rel) if rel else ""
+
+
+def read_image_scaled(path: str, min_side: int) -> QImage:
+    """Прочитать изображение так, чтобы меньшая сторона была не меньше min_side.
+
+    Масштаб задаётся читателю до декодирования: JPEG декодируется сразу в
+    уменьшенном виде, полноразмерный кадр в памяти не создаётся.
+    """
+    reader = QImageReader(path)
+    src = reader.size()
+    if src.isValid() and min(src.width(), src.height()) > min_side:
+        k = min_side / min(src.width(), src.height())
+        reader.setScaledSize(QSize(max(min_side, round(src.width() * k)), max(min_side, round(src.height() * k))))
+    return reader.read()
+
+
+def _circle_image(source: QImage, size: int) -> QImage:
+    """Круглая обрезка на QImage: безопасна вне GUI-потока (в отличие от QPixmap)."""
+    src = source.scaled(size, size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
+
+    out = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+    out.fill(Qt.transparent)
+
+    painter = QPainter(out)
+    painter.setRenderHint(QPainter.Antialiasing, True)
+
+    clip = QPainterPath()
+    clip.addEllipse(0, 0, size, size)
+    painter.setClipPath(clip)
+    painter.drawImage(0, 0, src)
+    painter.end()
+
+    return out
+
+
+# Готовые круглые pixmap-ы живут в QPixmapCache (общий для процесса, ограничен
+# по объёму): списки друзей/чатов перерисовываются на каждом обновлении, а
+# профиль открывается многократно, файлы же аватаров меняются редко.
+# Ключ — (путь, mtime_ns, байт в файле, размер) для файлов и ("initials", имя, размер) для заглушек.
+def _cache_key(key) -> str:
+    return "avatar:" + "\x1f".join(str(part) for part in key)
+
+
+def _cache_get(key):
+    pix = QPixmap()
+    if QPixmapCache.find(_cache_key(key), pix):
+        return pix
+    return None
+
+
+def _cache_put(key, pix: QPixmap):
+    QPixmapCache.insert(_cache_key(key), pix)
+
+
+class _AvatarDecoder(QObject):
+    """Чтение и декодирование файлов аватаров в одном фоновом потоке.
+
+    UI-поток получает готовый QImage нужного размера и только превращает его
+    в QPixmap. Одинаковые запросы от нескольких меток склеиваются.
+    """
+
+    _decoded = Signal(object, QImage)
+
+    def __init__(self):
+        super().__init__()
+        self._queue = queue.SimpleQueue()
+        self._waiting = {}
+        self._thread = None
+        self._decoded.connect(self._on_decoded)
+
+    def request(self, key, label):
+        waiters = self._waiting.get(key)
+        if waiters is not None:
+            waiters.append(weakref.ref(label))
+            return
+        self._waiting[key] = [weakref.ref(label)]
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._queue.put(key)
+
+    def _run(self):
+        while True:
+            key = self._queue.get()
+            path, _mtime, _bytes, size = key
+            image = read_image_scaled(path, size)
+            if not image.isNull():
+                image = _circle_image(image, size)
+            self._decoded.emit(key, image)
+
+    def _on_decoded(self, key, image: QImage):
+        waiters = self._waiting.pop(key, [])
+        if image.isNull():
+            # Битый файл: на метках остаются инициалы.
+            return
+        pix = QPixmap.fromImage(image)
+        _cache_put(key, pix)
+        for ref in waiters:
+            label = ref()
+            if label is None or label._avatar_key != key:
+                continue
+            try:
+                label.setPixmap(pix)
+            except RuntimeError:
+                # C++-часть метки уже удалена.
+                pass
+
+
+_decoder = None
+
+
+def _get_decoder() -> _AvatarDecoder:
+    # Создаётся в GUI-потоке при первом set_avatar, чтобы сигнал из рабочего
+    # потока доставлялся через очередь событий.
+    global _decoder
+    if _decoder is None:
+        _decoder = _AvatarDecoder()
+    return _decoder
 
 
 class AvatarLabel(QLabel):
@@ -13,6 +185,7 @@ class AvatarLabel(QLabel):
         super().__init__(parent)
         self.size_px = size
         self._online = None
+        self._avatar_key = None
         self._ring_color = "#2f3136"  # цвет "обводки" статуса под фон карточки
 
         self.setFixedSize(size, size)
@@ -20,6 +193,7 @@ class AvatarLabel(QLabel):
         self.setStyleSheet("border:2px solid #5865F2; border-radius:%dpx; background:transparent;" % (size//2))
 
         self._dot = QLabel(self)
+        self._dot_qss = ""
         self._dot.hide()
         self._dot.setAttribute(Qt.WA_TransparentForMouseEvents)
 
@@ -27,13 +201,35 @@ class AvatarLabel(QLabel):
 
     # ---------- public API ----------
     def set_avatar(self, path="", login="", nickname=""):
-        pix = self._load_pixmap(path, login)
-        if pix is None or pix.isNull():
-            pix = self._make_initials_avatar(nickname or login or "U")
-
         # Делаем внутреннее изображение немного меньше, чтобы обводка была хорошо видна
         inner = max(8, self.size_px - 8)
-        self.setPixmap(self._to_circle(pix, inner))
+
+        key = None
+        file_path = _resolve_avatar_file(path, login)
+        if file_path:
+            try:
+                st = os.stat(file_path)
+                key = (file_path, st.st_mtime_ns, st.st_size, inner)
+            except OSError:
+                key = None
+        self._avatar_key = key
+        if key is not None:
+            pix = _cache_get(key)
+            if pix is not None:
+                self.setPixmap(pix)
+                return
+
+        # Пока файл декодируется в фоне (или если его нет) — инициалы.
+        name = nickname or login or "U"
+        initials_key = ("initials", name, self.size_px, inner)
+        pix = _cache_get(initials_key)
+        if pix is None:
+            pix = self._to_circle(self._make_initials_avatar(name), inner)
+            _cache_put(initials_key, pix)
+        self.setPixmap(pix)
+
+        if key is not None:
+            _get_decoder().request(key, self)
 
     def set_online(self, online: bool | None, ring_color: str | None = None):
         """
@@ -57,9 +253,11 @@ class AvatarLabel(QLabel):
         self._dot.move(x, y)
 
         color = "#43b581" if online else "#747f8d"
-        self._dot.setStyleSheet(
-            f"background-color:{color}; border:{border}px solid {self._ring_color}; border-radius:{dot // 2}px;"
-        )
+        qss = f"background-color:{color}; border:{border}px solid {self._ring_color}; border-radius:{dot // 2}px;"
+        # heartbeat повторяет тот же статус: не разбираем QSS точки заново.
+        if qss != self._dot_qss:
+            self._dot_qss = qss
+            self._dot.setStyleSheet(qss)
         self._dot.show()
 
     # ---------- internals ----------
@@ -71,30 +269,6 @@ class AvatarLabel(QLabel):
         super().resizeEvent(event)
         self._reposition_dot()
 
-    def _client_dir(self):
-        # client/ui/avatar_widget.py -> client
-        return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-    def _load_pixmap(self, path, login):
-        # 1) Прямой путь
-        if path and os.path.exists(path):
-            return QPixmap(path)
-
-        # 2) Относительный путь от client
-        if path and not os.path.isabs(path):
-            p2 = os.path.join(self._client_dir(), path)
-            if os.path.exists(p2):
-                return QPixmap(p2)
-
-        # 3) fallback avatars/<login>.<ext>
-        if login:
-            for ext in (".png", ".jpg", ".jpeg"):
-                p = os.path.join(self._client_dir(), "avatars", f"{login}{ext}")
-                if os.path.exists(p):
-                    return QPixmap(p)
-
-        return None
-
     def _to_circle(self, source: QPixmap, size: int) -> QPixmap:
         if source.isNull():
             return QPixmap()
@@ -3,6 +3,24 @@ from PySide6.QtWidgets import QDialog, QVBoxLayout, QLabel, QPushButton, QHBoxLa
 from ui.avatar_widget import AvatarLabel
 
 
+# Стили меток состояния по цвету: строки собираются один раз, а не на каждый тик.
+_STATE_QSS = {
+    color: f"color:{color}; font-size:12px; font-weight:700;"
+    for color in ("#43b581", "#5865F2", "#8ea1e1")
+}
+_BARS_QSS = {
+    color: f"color:{color}; font-size:16px; font-weight:800; letter-spacing:2px;"
+    for color in ("#43b581", "#8ea1e1", "#faa61a", "#f04747")
+}
+
+
+def _set_qss_if_changed(widget, qss: str):
+    # setStyleSheet заново разбирает QSS и перестилизует виджет даже при той же строке.
+    if getattr(widget, "_applied_qss", None) != qss:
+        widget._applied_qss = qss
+        widget.setStyleSheet(qss)
+
+
 class ActiveCallWindow(QDialog):
     def __init__(
         self,
@@ -162,19 +180,19 @@ class ActiveCallWindow(QDialog):
         if peer and me:
             self.speaking_lbl.setText("Сейчас: говорите оба")
             self.state_lbl.setText("Двусторонний разговор")
-            self.state_lbl.setStyleSheet("color:#43b581; font-size:12px; font-weight:700;")
+            _set_qss_if_changed(self.state_lbl, _STATE_QSS["#43b581"])
         elif peer:
             self.speaking_lbl.setText(f"Сейчас говорит: {self.peer_nickname}")
             self.state_lbl.setText("Собеседник говорит")
-            self.state_lbl.setStyleSheet("color:#43b581; font-size:12px; font-weight:700;")
+            _set_qss_if_changed(self.state_lbl, _STATE_QSS["#43b581"])
         elif me:
             self.speaking_lbl.setText("Сейчас говорите: вы")
             self.state_lbl.setText("Вы говорите")
-            self.state_lbl.setStyleSheet("color:#5865F2; font-size:12px; font-weight:700;")
+            _set_qss_if_changed(self.state_lbl, _STATE_QSS["#5865F2"])
         else:
             self.speaking_lbl.setText("Сейчас: тишина")
             self.state_lbl.setText("Соединение активно")
-            self.state_lbl.setStyleSheet("color:#8ea1e1; font-size:12px; font-weight:700;")
+            _set_qss_if_changed(self.state_lbl, _STATE_QSS["#8ea1e1"])
 
         quality = a.get("quality")
         lat = a.get("latency_ms")
@@ -184,7 +202,7 @@ class ActiveCallWindow(QDialog):
             self.quality_lbl.setText(f"Качество: {quality} • ping {lat} ms • jitter {jit} ms")
             bars, color = self._bars_for_quality(score)
             self.quality_bars_lbl.setText(bars)
-            self.quality_bars_lbl.setStyleSheet(f"color:{color}; font-size:16px; font-weight:800; letter-spacing:2px;")
+            _set_qss_if_changed(self.quality_bars_lbl, _BARS_QSS[color])
 
         # style avatar state for pulse timer
         if peer:
@@ -197,9 +215,7 @@ class ActiveCallWindow(QDialog):
     def _pulse_avatar(self):
         mode = getattr(self, "_avatar_mode", "idle")
         if mode == "idle":
-            self.avatar.setProperty("speaking","idle")
-            self.avatar.style().unpolish(self.avatar)
-            self.avatar.style().polish(self.avatar)
+            self._set_avatar_speaking("idle")
             return
 
         self._pulse += self._pulse_dir
@@ -210,11 +226,15 @@ class ActiveCallWindow(QDialog):
 
         alpha = 55 + self._pulse * 20
         # Для градиентной подсветки используем динамические свойства из QSS
-        if mode == "peer":
-            self.avatar.setProperty("speaking", "peer")
-        else:
-            self.avatar.setProperty("speaking", "me")
         self.avatar.setProperty("pulse", str(alpha))
+        self._set_avatar_speaking("peer" if mode == "peer" else "me")
+
+    def _set_avatar_speaking(self, value: str):
+        # QSS выбирает стиль только по speaking: repolish нужен лишь при его смене,
+        # а не на каждом кадре пульсации (70 мс).
+        if self.avatar.property("speaking") == value:
+            return
+        self.avatar.setProperty("speaking", value)
         self.avatar.style().unpolish(self.avatar)
         self.avatar.style().polish(self.avatar)
 
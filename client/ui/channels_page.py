@@ -25,7 +25,6 @@ from utils.thread_safe_mixin import ThreadSafeMixin
 from ui.avatar_widget import AvatarLabel
 from ui.micro_interactions import install_opacity_feedback
 from ui.toast import InlineToast
-from voice_client import VoiceClient
 from settings import get_voice_endpoint
 
 
@@ -345,7 +344,7 @@ class ChannelsPage(QWidget, ThreadSafeMixin):
         super().__init__(parent)
         self.ctx = UserContext()
 
-        self._threads = []
+        self._threads = set()
         self._alive = True
 
         self.channels = []
@@ -2751,6 +2750,9 @@ class ChannelsPage(QWidget, ThreadSafeMixin):
         self._apply_channel_permissions_ui()
 
         try:
+            # Ленивый импорт: голосовой стек грузится только при входе в голосовой канал.
+            from voice_client import VoiceClient
+
             host, port = get_voice_endpoint()
             self._voice_client = VoiceClient(
                 self.ctx.login,
@@ -143,7 +143,7 @@ class ChatsPage(QWidget, ThreadSafeMixin):
         self.ctx = UserContext()
 
         # Для ThreadSafeMixin
-        self._threads = []
+        self._threads = set()
         self._alive = True
 
         # Состояние
@@ -156,6 +156,9 @@ class ChatsPage(QWidget, ThreadSafeMixin):
         self.unread_counts = {}
         self.unread_total = 0
         self.on_unread_total_changed = None
+        # True, пока MainWindow получает unread через push (unread_delta):
+        # тогда таймер списка не запрашивает get_unread_counts сам.
+        self.unread_pushed = False
 
         # Render/cache signatures for large lists
         self._friends_signature = ""
@@ -365,6 +368,9 @@ class ChatsPage(QWidget, ThreadSafeMixin):
     def _friends_tick(self):
         if not self._is_poll_allowed():
             return
+        if self.unread_pushed:
+            self.load_friends()
+            return
         self.load_unread_counts()
 
     def _clear_friends(self):
@@ -472,6 +478,21 @@ class ChatsPage(QWidget, ThreadSafeMixin):
 
         self.start_request(data, cb)
 
+    def apply_unread_counts(self, counts: dict, total: int):
+        """Принять unread, присланные сервером через push."""
+        self.unread_counts = dict(counts or {})
+        try:
+            self.unread_total = int(total or 0)
+        except Exception:
+            self.unread_total = sum(self.unread_counts.values())
+
+        if callable(self.on_unread_total_changed):
+            self.on_unread_total_changed(self.unread_total)
+
+        # Бейджи в списке друзей перерисуются по сигнатуре при следующей загрузке.
+        if self._friends_loaded_once and self._is_poll_allowed():
+            self.load_friends()
+
     def mark_chat_read(self, friend_login: str):
         if not self.ctx.login:
             return
@@ -106,7 +106,7 @@ class FriendsPage(QWidget, ThreadSafeMixin):
         self.ctx = UserContext()
 
         # ThreadSafeMixin state
-        self._threads = []
+        self._threads = set()
         self._alive = True
 
         # state flags
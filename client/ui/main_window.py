@@ -1,34 +1,128 @@
-from PySide6.QtCore import QTimer, Qt, QRect, QEvent
-import os
-import socket
+from PySide6.QtCore import QTimer, Qt, QRect, QEvent, Signal
+import html
+import threading
+import time
 from types import SimpleNamespace
 
 from PySide6.QtWidgets import (
     QWidget, QHBoxLayout, QVBoxLayout, QPushButton,
     QSizePolicy, QStackedWidget, QApplication, QLabel, QFrame
 )
-from PySide6.QtGui import QIcon
 
-from ui.channels_page import ChannelsPage
-from ui.profile_page import ProfilePage
 from ui.friends_page import FriendsPage
-from ui.chats_page import ChatsPage
 from ui.avatar_widget import AvatarLabel
-from ui.call_window import ActiveCallWindow
 
 from user_context import UserContext
-from network import NetworkThread, send_json_packet, recv_json_packet
-from voice_client import VoiceClient
+from network import ApiWorker, ControlChannel, PushClient
 from config import clear_config
-from settings import get_voice_endpoint, get_api_endpoint
+from settings import get_voice_endpoint
 from ui.micro_interactions import install_opacity_feedback
+from style_manager import get_app_icon
+
+
+# Голосовой стек (sounddevice/numpy/PortAudio) и окно звонка импортируются
+# лениво при первом звонке: большинство сессий обходится без них.
+_VoiceClient = None
+_ActiveCallWindow = None
+
+
+def _get_voice_client_cls():
+    global _VoiceClient
+    if _VoiceClient is None:
+        from voice_client import VoiceClient
+        _VoiceClient = VoiceClient
+    return _VoiceClient
+
+
+def _get_call_window_cls():
+    global _ActiveCallWindow
+    if _ActiveCallWindow is None:
+        from ui.call_window import ActiveCallWindow
+        _ActiveCallWindow = ActiveCallWindow
+    return _ActiveCallWindow
+
+
+# Правила навигации живут в stylesheet самого sidebar: Qt резолвит селекторы
+# по локальному кэшу виджета, а не по всему глобальному stylesheet приложения.
+_SIDEBAR_QSS = """
+QPushButton#NavButton {
+    background-color:#2f3136; border-radius:10px; min-height:40px;
+    font-weight:800; letter-spacing:0.2px; qproperty-iconSize: 0px;
+    text-align:center; padding-left:0px;
+}
+QPushButton#NavButton:hover { background-color:#5865F2; }
+QPushButton#NavButton:pressed { padding-top:1px; }
+QPushButton#NavButton[active="true"] { background:#5865F2; }
+"""
+
+
+# Интервалы сервисного polling (мс): активное окно / фон.
+# Ответ heartbeat несёт online-статус, поэтому отдельного "status" в цикле нет.
+_SERVICE_POLL_INTERVALS = {
+    "poll_events": 1000,
+    "heartbeat": 5000,
+    "get_my_channel_invites": 9000,
+}
+_SERVICE_POLL_INTERVALS_BG = {
+    "poll_events": 2600,
+    "heartbeat": 12000,
+    "get_my_channel_invites": 18000,
+}
+# Окно в фоне и нет звонка: только редкий heartbeat (presence, ONLINE_WINDOW на
+# сервере — 45 с) и poll_events как fallback, пока push-канал не подключён.
+_SERVICE_POLL_INTERVALS_IDLE = {
+    "poll_events": 5000,
+    "heartbeat": 30000,
+}
+
+# Сверка счётчика инвайтов, пока он приходит через push (invite_delta), мс.
+_INVITES_RECONCILE_MS = 300_000
+
+# Свежесть последнего ответа get_my_channel_invites для внеплановых запросов (с).
+_INVITES_CACHE_TTL_SEC = 4.0
+
+# События, которые сервер доставляет через push-канал (и poll_events как fallback).
+_CALL_EVENT_TYPES = {"incoming_call", "call_accepted", "call_started", "call_declined", "call_ended"}
+
+_USER_CARD_HTML = (
+    "<div style='font-weight:800; font-size:12px; color:white;'>{nick}</div>"
+    "<div style='color:#b9bbbe; font-size:11px;'>{login}</div>"
+)
+
+
+# Общая политика размера для всех кнопок меню (QSizePolicy — value-тип, копируется при set).
+_NAV_SIZE_POLICY = QSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+
+# Кнопки бокового меню: (атрибут окна, текст, слот навигации) в порядке отображения.
+_NAV_SPEC = (
+    ("btn_friends", "Друзья", "show_friends"),
+    ("btn_chats", "Чаты", "show_chats"),
+    ("btn_channels", "Каналы", "show_channels"),
+    ("btn_profile", "Мой профиль", "show_profile"),
+)
+
+
+class NavButton(QPushButton):
+    """Кнопка бокового меню: политики размера задаются один раз в конструкторе."""
+
+    def __init__(self, text, callback, parent=None):
+        super().__init__(text, parent)
+        self.setFixedHeight(50)
+        self.setSizePolicy(_NAV_SIZE_POLICY)
+        self.setObjectName("NavButton")
+        self.clicked.connect(callback)
+        install_opacity_feedback(self, hover_opacity=0.99, pressed_opacity=0.94, duration_ms=85)
 
 
 class MainWindow(QWidget):
+    # (номер запуска, peer) — прошлый VoiceClient остановлен, из фонового потока
+    _voice_client_retired = Signal(int, str)
+
     def __init__(self, controller=None):
         super().__init__()
         self.controller = controller
-        self.ctx = self._snapshot_context(UserContext())
+        self._set_context(UserContext())
 
         self.is_logging_out = False
         self._is_closing = False
@@ -39,34 +133,36 @@ class MainWindow(QWidget):
         self.setObjectName("MainWindowRoot")
 
         # Иконка приложения (если есть)
-        current_dir = os.path.dirname(os.path.abspath(__file__))   # client/ui
-        client_dir = os.path.dirname(current_dir)                  # client
-        icon_path = os.path.join(client_dir, "icons", "app_icon.png")
-        if os.path.exists(icon_path):
-            self.setWindowIcon(QIcon(icon_path))
+        icon = get_app_icon()
+        if icon is not None:
+            self.setWindowIcon(icon)
 
         # ---------------- Stack ----------------
         self.stack = QStackedWidget(self)
 
         self.friends_page = FriendsPage(self)      # index 0
-        self.chats_page = ChatsPage(self)          # index 1
-        self.channels_page = ChannelsPage(self)    # index 2
-        self.profile_page = ProfilePage(self.ctx.login, self.ctx.nickname, self)  # index 3
-        self.profile_page.ctx = self.ctx
-
-        # Подписка на обновление общего unread из ChatsPage
-        self.chats_page.on_unread_total_changed = self.update_chats_badge
-        # Подписка на количество входящих приглашений в каналы
-        self.channels_page.on_invites_count_changed = self.update_channels_badge
+        # Чаты, каналы и профиль создаются при первом переходе на вкладку
+        # (_ensure_chats_page / _ensure_channels_page / _ensure_profile_page);
+        # до этого индексы 1–3 в stack занимают пустые заглушки. Бейджи до
+        # создания страниц обновляют окно (refresh_unread_badge, push) и
+        # сервисный poll_batch.
+        self.chats_page = None                     # index 1
+        self.channels_page = None                  # index 2
+        self.profile_page = None                   # index 3
+        # Unread, полученные до создания ChatsPage: ими она инициализируется.
+        self._unread_counts = {}
+        self._unread_total = 0
+        self._unread_badge_request = None
 
         self.stack.addWidget(self.friends_page)
-        self.stack.addWidget(self.chats_page)
-        self.stack.addWidget(self.channels_page)
-        self.stack.addWidget(self.profile_page)
+        self.stack.addWidget(QWidget())
+        self.stack.addWidget(QWidget())
+        self.stack.addWidget(QWidget())
 
         # ---------------- Sidebar ----------------
         sidebar = QWidget()
         sidebar.setObjectName("Sidebar")
+        sidebar.setStyleSheet(_SIDEBAR_QSS)
         menu_layout = QVBoxLayout(sidebar)
         menu_layout.setContentsMargins(10, 10, 10, 10)
         menu_layout.setSpacing(10)
@@ -81,37 +177,22 @@ class MainWindow(QWidget):
         self.user_avatar.set_avatar(path=getattr(self.ctx, "avatar", ""), login=self.ctx.login, nickname=self.ctx.nickname)
         self.user_avatar.set_online(None if not self.ctx.login else False, ring_color="#2f3136")
         uc_l.addWidget(self.user_avatar)
-        txt_col = QVBoxLayout()
-        txt_col.setContentsMargins(0,0,0,0)
-        txt_col.setSpacing(0)
-        self.user_nick_lbl = QLabel(self.ctx.nickname or "Гость")
-        self.user_nick_lbl.setObjectName("UserMiniNick")
-        self.user_login_lbl = QLabel(self.ctx.login or "")
-        self.user_login_lbl.setObjectName("UserMiniLogin")
-        txt_col.addWidget(self.user_nick_lbl)
-        txt_col.addWidget(self.user_login_lbl)
-        uc_l.addLayout(txt_col)
+        # Ник и логин — один rich-text QLabel вместо вложенного QVBoxLayout с двумя метками.
+        self.user_text_lbl = QLabel()
+        self.user_text_lbl.setObjectName("UserMiniText")
+        self.user_text_lbl.setTextFormat(Qt.RichText)
+        uc_l.addWidget(self.user_text_lbl, 1)
+        self.set_user_card_text(self.ctx.nickname, self.ctx.login)
         menu_layout.addWidget(self.user_card)
         install_opacity_feedback(self.user_card, hover_opacity=0.995, pressed_opacity=0.975, duration_ms=90)
 
-        def make_button(text, callback):
-            btn = QPushButton(text)
-            btn.setFixedHeight(50)
-            btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
-            btn.setObjectName("NavButton")
-            btn.clicked.connect(callback)
-            install_opacity_feedback(btn, hover_opacity=0.99, pressed_opacity=0.94, duration_ms=85)
-            return btn
-
-        self.btn_friends = make_button("Друзья", self.show_friends)
-        self.btn_chats = make_button("Чаты", self.show_chats)
-        self.btn_channels = make_button("Каналы", self.show_channels)
-        self.btn_profile = make_button("Мой профиль", self.show_profile)
-
-        menu_layout.addWidget(self.btn_friends)
-        menu_layout.addWidget(self.btn_chats)
-        menu_layout.addWidget(self.btn_channels)
-        menu_layout.addWidget(self.btn_profile)
+        nav_buttons = []
+        for attr, text, slot in _NAV_SPEC:
+            btn = NavButton(text, getattr(self, slot), sidebar)
+            setattr(self, attr, btn)
+            menu_layout.addWidget(btn)
+            nav_buttons.append(btn)
+        self._nav_buttons = tuple(nav_buttons)
         menu_layout.addStretch()
 
         # ---------------- Root layout ----------------
@@ -131,39 +212,53 @@ class MainWindow(QWidget):
         # Стартовая вкладка
         self.show_friends()
 
-        # И сразу подгрузим unread, чтобы кнопка "Чаты" была актуальной
-        self.chats_page.load_unread_counts(force=True)
-
         # Бейдж приглашений во вкладке "Каналы" (обновляется глобально,
         # чтобы счётчик был актуален даже когда вкладка каналов не открыта).
         self._channel_invites_badge_thread = None
         self._channel_invites_badge_count = 0
-        self.channel_invites_badge_timer = QTimer(self)
-        self.channel_invites_badge_timer.timeout.connect(self.poll_channel_invites_badge)
-        self.channel_invites_badge_timer.start(9000)
-        self.poll_channel_invites_badge(force=True)
-
-        # Call signaling poll
+        # Последний ответ get_my_channel_invites: ((login, token), monotonic, count).
+        self._invites_cache = None
+        # Последний выставленный текст бейджей: setText на кнопке пересчитывает
+        # sizeHint и перерисовывает её даже при том же тексте.
+        self._chats_badge_text = None
+        self._channels_badge_text = None
+
+        # Call signaling
         self.current_call_user = None
         self.voice_client = None
-        self.call_poll_thread = None
+        self._voice_retire_thread = None
+        self._voice_start_seq = 0
+        self._voice_client_retired.connect(self._on_voice_client_retired)
         self.call_window = None
+        self._call_info_request = None
         self._outgoing_call_thread = None
-        self.call_events_timer = QTimer(self)
-        self.call_events_timer.timeout.connect(self.poll_call_events)
-        self.call_events_timer.start(1000)
-
-        # Heartbeat для корректного online/presence на сервере
-        self.heartbeat_timer = QTimer(self)
-        self.heartbeat_timer.timeout.connect(self._heartbeat)
-        self.heartbeat_timer.start(10000)
 
         # Self-status в мини-карточке слева (зелёная/серая точка на аватаре)
         self._self_status_thread = None
         self._self_status_failures = 0
-        self.self_status_timer = QTimer(self)
-        self.self_status_timer.timeout.connect(self.refresh_self_status)
-        self.self_status_timer.start(5000)
+
+        # Сервисные запросы окна идут через один worker с keep-alive сокетом
+        # вместо отдельного потока и TCP-соединения на каждый запрос.
+        self.api = ApiWorker()
+        # Синхронные control-RPC (logout / release_call_state / presence_offline).
+        self._control = ControlChannel()
+
+        # Сервисный polling (call events / heartbeat / self-status / инвайты):
+        # один single-shot таймер, взводимый на ближайший срок среди пунктов,
+        # и один запрос poll_batch, в который попадают только просроченные.
+        self._service_intervals = dict(_SERVICE_POLL_INTERVALS)
+        self._service_last_run = {}
+        self._service_poll_thread = None
+        self.service_poll_timer = QTimer(self)
+        self.service_poll_timer.setSingleShot(True)
+        self.service_poll_timer.timeout.connect(self._poll_batch)
+
+        # Push-канал событий: пока он подключён, poll_events из batch исключается.
+        self._push = None
+        self._start_push_channel()
+        self._schedule_service_poll()
+
+        self.poll_channel_invites_badge(force=True)
         self.refresh_self_status(force=True)
 
         # Встроенные (inline) уведомления/карточки звонка внутри главного окна.
@@ -186,6 +281,25 @@ class MainWindow(QWidget):
 
         self._apply_polling_policy(force=True)
 
+    def set_user_card_text(self, nickname: str, login: str):
+        """Обновить ник/логин в мини-карточке слева одним setText."""
+        self.user_text_lbl.setText(_USER_CARD_HTML.format(
+            nick=html.escape(nickname or "Гость"),
+            login=html.escape(login or ""),
+        ))
+
+    def _set_context(self, src_ctx):
+        """Заменить контекст окна и кэш (login, token) для сервисных запросов.
+
+        self.ctx меняется только здесь, поэтому polling и обработчики звонков
+        читают пару из self._creds, не проходя по атрибутам контекста.
+        _auth_payload — готовая база {"login", "token"} для запросов сессии:
+        call site-ы дописывают только action и свои поля.
+        """
+        self.ctx = self._snapshot_context(src_ctx)
+        self._creds = (self.ctx.login or "", self.ctx.session_token or "")
+        self._auth_payload = {"login": self._creds[0], "token": self._creds[1]}
+
     def _snapshot_context(self, src_ctx):
         """Локальная копия контекста для конкретного окна.
 
@@ -228,17 +342,6 @@ class MainWindow(QWidget):
                 pass
         return True
 
-    @staticmethod
-    def _set_timer_interval(timer: QTimer, interval_ms: int):
-        try:
-            interval_ms = int(interval_ms)
-        except Exception:
-            return
-        if interval_ms <= 0:
-            return
-        if timer.interval() != interval_ms:
-            timer.setInterval(interval_ms)
-
     def _apply_polling_policy(self, force: bool = False):
         """Centralized polling visibility policy.
 
@@ -256,50 +359,17 @@ class MainWindow(QWidget):
             "window_active": window_active,
         }
 
-        # Service timers: always enabled in session, but slower in background.
-        call_interval = 1000 if window_active else 2600
-        hb_interval = 10000 if window_active else 18000
-        status_interval = 5000 if window_active else 12000
-        invites_badge_interval = 9000 if window_active else 18000
-
-        try:
-            self._set_timer_interval(self.call_events_timer, call_interval)
-            if self.ctx.login:
-                if not self.call_events_timer.isActive():
-                    self.call_events_timer.start(call_interval)
-            elif self.call_events_timer.isActive():
-                self.call_events_timer.stop()
-        except Exception:
-            pass
-
-        try:
-            self._set_timer_interval(self.heartbeat_timer, hb_interval)
-            if self.ctx.login:
-                if not self.heartbeat_timer.isActive():
-                    self.heartbeat_timer.start(hb_interval)
-            elif self.heartbeat_timer.isActive():
-                self.heartbeat_timer.stop()
-        except Exception:
-            pass
-
-        try:
-            self._set_timer_interval(self.self_status_timer, status_interval)
-            if self.ctx.login:
-                if not self.self_status_timer.isActive():
-                    self.self_status_timer.start(status_interval)
-            elif self.self_status_timer.isActive():
-                self.self_status_timer.stop()
-        except Exception:
-            pass
-
-        # Lightweight polling только для счётчика приглашений на кнопке "Каналы".
+        # Service polling: always enabled in session, slower in background and
+        # reduced to a rare keepalive when the window is idle without a call.
+        call_pending = bool(self.current_call_user or getattr(self, "_incoming_from_user", None))
+        if window_active:
+            self._service_intervals = dict(_SERVICE_POLL_INTERVALS)
+        elif call_pending:
+            self._service_intervals = dict(_SERVICE_POLL_INTERVALS_BG)
+        else:
+            self._service_intervals = dict(_SERVICE_POLL_INTERVALS_IDLE)
         try:
-            self._set_timer_interval(self.channel_invites_badge_timer, invites_badge_interval)
-            if self.ctx.login:
-                if not self.channel_invites_badge_timer.isActive():
-                    self.channel_invites_badge_timer.start(invites_badge_interval)
-            elif self.channel_invites_badge_timer.isActive():
-                self.channel_invites_badge_timer.stop()
+            self._schedule_service_poll()
         except Exception:
             pass
 
@@ -308,16 +378,7 @@ class MainWindow(QWidget):
         now_friends = bool(desired["friends"])
         if force or (prev_friends != now_friends):
             try:
-                if hasattr(self.friends_page, "set_polling_enabled"):
-                    self.friends_page.set_polling_enabled(now_friends)
-                else:
-                    if now_friends:
-                        self.friends_page.refresh()
-                        if hasattr(self.friends_page, "timer") and not self.friends_page.timer.isActive():
-                            self.friends_page.timer.start(2500)
-                    else:
-                        if hasattr(self.friends_page, "timer") and self.friends_page.timer.isActive():
-                            self.friends_page.timer.stop()
+                self.friends_page.set_polling_enabled(now_friends)
             except Exception:
                 pass
 
@@ -327,8 +388,8 @@ class MainWindow(QWidget):
         if force or (prev_chats != now_chats):
             try:
                 if now_chats:
-                    self.chats_page.start_auto_update(force_refresh=True)
-                else:
+                    self._ensure_chats_page().start_auto_update(force_refresh=True)
+                elif self.chats_page is not None:
                     self.chats_page.stop_auto_update()
             except Exception:
                 pass
@@ -339,8 +400,8 @@ class MainWindow(QWidget):
         if force or (prev_channels != now_channels):
             try:
                 if now_channels:
-                    self.channels_page.start_auto_update()
-                else:
+                    self._ensure_channels_page().start_auto_update()
+                elif self.channels_page is not None:
                     self.channels_page.stop_auto_update()
             except Exception:
                 pass
@@ -348,9 +409,17 @@ class MainWindow(QWidget):
         was_active = self._poll_state.get("window_active", None)
         if window_active and (force or (was_active is False) or (was_active is None)):
             try:
-                self.refresh_self_status(force=True)
+                # Без force: не плодим второй запрос статуса, если один уже в полёте.
+                self.refresh_self_status()
             except Exception:
                 pass
+            if was_active is False:
+                # В фоне счётчик инвайтов не опрашивался — догоняем сразу
+                # (без force: при частой смене фокуса сработает TTL-кэш).
+                try:
+                    self.poll_channel_invites_badge()
+                except Exception:
+                    pass
 
         self._poll_state = desired
 
@@ -361,6 +430,8 @@ class MainWindow(QWidget):
     def _setup_inline_call_ui(self):
         self._incoming_from_user = None
         self._incoming_action_thread = None
+        self._reposition_pending = False
+        self._last_reposition_key = None
 
         self._call_notice_timer = QTimer(self)
         self._call_notice_timer.setSingleShot(True)
@@ -410,6 +481,23 @@ class MainWindow(QWidget):
         incoming_l.addLayout(row)
 
     def _reposition_inline_call_ui(self):
+        """Schedule one deferred reposition of the inline call overlays.
+
+        Вызывается на каждое переключение страницы, resize и показ toast'ов —
+        несколько вызовов за один проход event loop схлопываются в один.
+        """
+        if getattr(self, "_reposition_pending", False):
+            return
+        self._reposition_pending = True
+        QTimer.singleShot(0, self._flush_reposition)
+
+    def _flush_reposition(self):
+        if not self._reposition_pending:
+            return
+        self._reposition_pending = False
+        self._do_reposition_inline_call_ui()
+
+    def _do_reposition_inline_call_ui(self):
         """Position inline call overlays at bottom-center of current page.
 
         Центрируем не по всему приложению, а по текущему открытому окну
@@ -450,6 +538,17 @@ class MainWindow(QWidget):
             )
         )
 
+        # Размеры overlay'ев зависят только от ширины страницы и текста —
+        # если ничего не поменялось, не трогаем adjustSize()/move().
+        reposition_key = (
+            ox, oy, ow, oh, has_incoming, has_notice,
+            self.incoming_from_lbl.text() if getattr(self, "incoming_from_lbl", None) else "",
+            self.call_notice_lbl.text() if getattr(self, "call_notice_lbl", None) else "",
+        )
+        if reposition_key == self._last_reposition_key:
+            return
+        self._last_reposition_key = reposition_key
+
         in_w = in_h = n_w = n_h = 0
 
         if getattr(self, "incoming_card", None):
@@ -533,7 +632,8 @@ class MainWindow(QWidget):
 
     def _respond_incoming_inline(self, accept: bool):
         from_user = self._incoming_from_user
-        if not from_user or not getattr(self.ctx, "login", ""):
+        login, token = self._creds
+        if not from_user or not login:
             self._hide_incoming_inline()
             return
         if self._incoming_action_thread and self._incoming_action_thread.isRunning():
@@ -541,13 +641,6 @@ class MainWindow(QWidget):
 
         self._set_incoming_buttons_enabled(False)
         action = "accept_call" if accept else "decline_call"
-        self._incoming_action_thread = NetworkThread(None, None, {
-            "action": action,
-            "login": self.ctx.login,
-            "from_user": from_user,
-            "token": self.ctx.session_token,
-        })
-
         def _done(resp):
             ok = isinstance(resp, dict) and resp.get("status") == "ok"
             if ok:
@@ -569,8 +662,12 @@ class MainWindow(QWidget):
 
             self._incoming_action_thread = None
 
-        self._incoming_action_thread.finished.connect(_done)
-        self._incoming_action_thread.start()
+        self._incoming_action_thread = self.api.submit({
+            "action": action,
+            "login": login,
+            "from_user": from_user,
+            "token": token,
+        }, _done)
 
     def _accept_incoming_inline(self):
         self._respond_incoming_inline(True)
@@ -580,7 +677,8 @@ class MainWindow(QWidget):
 
     def start_outgoing_call(self, friend_login: str):
         """Отправка вызова с inline-уведомлением внутри main-окна."""
-        if not friend_login or not getattr(self.ctx, "login", ""):
+        login, token = self._creds
+        if not friend_login or not login:
             return
         if self._outgoing_call_thread and self._outgoing_call_thread.isRunning():
             self._show_call_notice("Подождите, предыдущий вызов ещё отправляется", timeout_ms=1800)
@@ -588,13 +686,11 @@ class MainWindow(QWidget):
 
         data = {
             "action": "call_user",
-            "from_user": self.ctx.login,
+            "from_user": login,
             "to_user": friend_login,
-            "token": self.ctx.session_token,
+            "token": token,
         }
 
-        self._outgoing_call_thread = NetworkThread(None, None, data)
-
         def _done(resp):
             try:
                 if isinstance(resp, dict) and resp.get("status") == "ok":
@@ -607,18 +703,18 @@ class MainWindow(QWidget):
             finally:
                 self._outgoing_call_thread = None
 
-        self._outgoing_call_thread.finished.connect(_done)
-        self._outgoing_call_thread.start()
+        self._outgoing_call_thread = self.api.submit(data, _done)
 
     # ==================================================
     # ================== Бейдж "Чаты" ==================
     # ==================================================
 
     def update_chats_badge(self, total: int):
-        if total > 0:
-            self.btn_chats.setText(f"Чаты ({total})")
-        else:
-            self.btn_chats.setText("Чаты")
+        text = f"Чаты ({total})" if total > 0 else "Чаты"
+        if text == self._chats_badge_text:
+            return
+        self._chats_badge_text = text
+        self.btn_chats.setText(text)
 
     def update_channels_badge(self, total: int):
         try:
@@ -628,12 +724,204 @@ class MainWindow(QWidget):
 
         self._channel_invites_badge_count = max(0, total)
         if self._channel_invites_badge_count > 0:
-            self.btn_channels.setText(f"Каналы ({self._channel_invites_badge_count})")
+            text = f"Каналы ({self._channel_invites_badge_count})"
         else:
-            self.btn_channels.setText("Каналы")
+            text = "Каналы"
+        if text == self._channels_badge_text:
+            return
+        self._channels_badge_text = text
+        self.btn_channels.setText(text)
+
+    def _effective_service_intervals(self):
+        """Интервалы poll_batch с учётом push-канала.
+
+        Пока push подключён, события звонков и бейджей приходят через него:
+        poll_events не опрашивается, а инвайты — только редкая сверка
+        на случай потерянного события.
+        """
+        intervals = dict(self._service_intervals)
+        if self._push is not None and self._push.connected:
+            intervals.pop("poll_events", None)
+            if "get_my_channel_invites" in intervals:
+                intervals["get_my_channel_invites"] = _INVITES_RECONCILE_MS
+        return intervals
+
+    def _schedule_service_poll(self):
+        """Взвести service_poll_timer на ближайший срок среди пунктов poll_batch.
+
+        Вместо фиксированного тика с шагом минимального интервала таймер
+        просыпается ровно к следующему просроченному пункту.
+        """
+        if not self._creds[0] or self._is_closing:
+            self.service_poll_timer.stop()
+            return
+        now = time.monotonic()
+        deadlines = [
+            interval_ms - (now - self._service_last_run.get(name, 0.0)) * 1000.0
+            for name, interval_ms in self._effective_service_intervals().items()
+        ]
+        if not deadlines:
+            self.service_poll_timer.stop()
+            return
+        self.service_poll_timer.start(max(50, int(min(deadlines))))
+
+    def _poll_batch(self):
+        """Тик сервисного polling: один poll_batch на все пункты с подошедшим сроком.
+
+        Вместо отдельного TCP-соединения на heartbeat (он же self-status), инвайты и
+        call events сервер получает один запрос и отвечает словарём results,
+        который раскладывается по обычным обработчикам.
+        """
+        login, token = self._creds
+        if not login or not token:
+            return
+        if self._service_poll_thread and self._service_poll_thread.isRunning():
+            # Следующий срок взведёт _done текущего запроса.
+            return
+
+        now = time.monotonic()
+        items = []
+        for name, interval_ms in self._effective_service_intervals().items():
+            if (now - self._service_last_run.get(name, 0.0)) * 1000.0 < interval_ms:
+                continue
+            # Если сейчас вкладка каналов активна, счётчик и так обновится в ChannelsPage;
+            # срок сдвигаем, чтобы таймер не просыпался на этот пункт впустую.
+            if name == "get_my_channel_invites" and self.stack.currentWidget() is self.channels_page:
+                self._service_last_run[name] = now
+                continue
+            items.append(name)
+        if not items:
+            self._schedule_service_poll()
+            return
+        for name in items:
+            self._service_last_run[name] = now
+
+        def _done(resp):
+            try:
+                results = resp.get("results") if isinstance(resp, dict) else None
+                if not isinstance(results, dict):
+                    results = {}
+                # Ошибку всего батча (сеть/сессия) отдаём каждому обработчику как есть.
+                if "heartbeat" in items:
+                    self._apply_self_status(results.get("heartbeat") or resp)
+                if "get_my_channel_invites" in items:
+                    self._apply_channel_invites(results.get("get_my_channel_invites") or resp)
+                if "poll_events" in items:
+                    self._handle_polled_events(results.get("poll_events") or resp)
+            finally:
+                self._service_poll_thread = None
+                self._schedule_service_poll()
+
+        self._service_poll_thread = self.api.submit(
+            {**self._auth_payload, "action": "poll_batch", "items": items}, _done
+        )
+
+    # ==================================================
+    # ================== Push-канал =====================
+    # ==================================================
+
+    def _start_push_channel(self):
+        login, token = self._creds
+        push = self._push
+        if push is not None and push.isRunning() and (push.login, push.token) == (login, token):
+            return
+        self._stop_push_channel()
+        if not login or not token:
+            return
+        self._push = PushClient(login, token)
+        self._push.event_received.connect(self._on_push_event)
+        self._push.connection_changed.connect(self._on_push_connection_changed)
+        self._push.start()
+
+    def _stop_push_channel(self):
+        push = getattr(self, "_push", None)
+        self._push = None
+        if push is None:
+            return
+        try:
+            push.event_received.disconnect(self._on_push_event)
+            push.connection_changed.disconnect(self._on_push_connection_changed)
+        except Exception:
+            pass
+        push.stop()
+
+    def _on_push_connection_changed(self, connected: bool):
+        # Unread приходит через push — ChatsPage может не опрашивать его сама.
+        if self.chats_page is not None:
+            self.chats_page.unread_pushed = bool(connected)
+        # Пересчитать период тика: без push нужен fallback-опрос poll_events.
+        self._apply_polling_policy()
+
+    def _on_push_event(self, ev: dict):
+        et = ev.get("type")
+        if et in _CALL_EVENT_TYPES:
+            self.handle_call_events({"status": "ok", "events": [ev]})
+        elif et == "invite_delta":
+            self.update_channels_badge(ev.get("count", 0))
+        elif et == "unread_delta":
+            self._apply_unread_counts(ev.get("counts") or {}, ev.get("total", 0))
+
+    def _apply_unread_counts(self, counts: dict, total):
+        if self.chats_page is not None:
+            # Страница сама обновит бейдж через on_unread_total_changed.
+            self.chats_page.apply_unread_counts(counts, total)
+            return
+        try:
+            total = int(total or 0)
+        except Exception:
+            total = 0
+        self._unread_counts = dict(counts or {})
+        self._unread_total = total
+        self.update_chats_badge(total)
+
+    def refresh_unread_badge(self):
+        """Подгрузить unread, чтобы кнопка "Чаты" была актуальной.
+
+        Пока ChatsPage не создана, запрос идёт через ApiWorker окна: строить
+        страницу ради одного числа на бейдже незачем.
+        """
+        if self.chats_page is not None:
+            self.chats_page.load_unread_counts(force=True)
+            return
+        if not self._creds[0] or not self._creds[1]:
+            return
+        if self._unread_badge_request and self._unread_badge_request.isRunning():
+            return
+
+        def _done(resp):
+            try:
+                if isinstance(resp, dict) and resp.get("status") == "ok":
+                    self._apply_unread_counts(resp.get("counts") or {}, resp.get("total", 0))
+            finally:
+                self._unread_badge_request = None
+
+        self._unread_badge_request = self.api.submit(
+            {**self._auth_payload, "action": "get_unread_counts"}, _done
+        )
+
+    def _handle_polled_events(self, resp):
+        # Fallback без push: poll_events отдаёт ту же очередь событий.
+        # Пустой ответ — типичный случай простоя, сразу выходим.
+        if not isinstance(resp, dict) or resp.get("status") != "ok":
+            return
+        events = resp.get("events")
+        if not events:
+            return
+        # События звонков — одним вызовом, чтобы policy пересчитался один раз.
+        call_events = []
+        for ev in events:
+            if not isinstance(ev, dict):
+                continue
+            if ev.get("type") in _CALL_EVENT_TYPES:
+                call_events.append(ev)
+            else:
+                self._on_push_event(ev)
+        if call_events:
+            self.handle_call_events({"status": "ok", "events": call_events})
 
     def poll_channel_invites_badge(self, force: bool = False):
-        if not getattr(self.ctx, "login", "") or not getattr(self.ctx, "session_token", ""):
+        login, token = self._creds
+        if not login or not token:
             self.update_channels_badge(0)
             return
 
@@ -644,41 +932,41 @@ class MainWindow(QWidget):
         if (not force) and self.stack.currentWidget() is self.channels_page:
             return
 
-        self._channel_invites_badge_thread = NetworkThread(None, None, {
-            "action": "get_my_channel_invites",
-            "login": self.ctx.login,
-            "token": self.ctx.session_token,
-        })
+        cache = self._invites_cache
+        if (
+            (not force)
+            and cache is not None
+            and cache[0] == self._creds
+            and time.monotonic() - cache[1] < _INVITES_CACHE_TTL_SEC
+        ):
+            self.update_channels_badge(cache[2])
+            return
+
+        self._service_last_run["get_my_channel_invites"] = time.monotonic()
 
         def _done(resp):
             try:
-                if isinstance(resp, dict) and resp.get("status") == "ok":
-                    invites = resp.get("invites") or []
-                    self.update_channels_badge(len(invites))
+                self._apply_channel_invites(resp)
             finally:
                 self._channel_invites_badge_thread = None
 
-        self._channel_invites_badge_thread.finished.connect(_done)
-        self._channel_invites_badge_thread.start()
+        self._channel_invites_badge_thread = self.api.submit(
+            {**self._auth_payload, "action": "get_my_channel_invites"}, _done
+        )
 
-    def _heartbeat(self):
-        """Keep session alive on server."""
-        if not getattr(self.ctx, "session_token", ""):
-            return
-        try:
-            t = NetworkThread(None, None, {
-                "action": "heartbeat",
-                "login": self.ctx.login,
-                "token": self.ctx.session_token,
-            })
-            t.start()
-        except Exception:
-            pass
+    def _apply_channel_invites(self, resp):
+        if isinstance(resp, dict) and resp.get("status") == "ok":
+            invites = resp.get("invites") or []
+            self._invites_cache = (
+                self._creds,
+                time.monotonic(),
+                len(invites),
+            )
+            self.update_channels_badge(len(invites))
 
     def refresh_self_status(self, force: bool = False):
         """Обновить онлайн-статус текущего пользователя для мини-карточки слева."""
-        login = getattr(self.ctx, "login", "")
-        token = getattr(self.ctx, "session_token", "")
+        login, token = self._creds
 
         if not login:
             try:
@@ -699,86 +987,155 @@ class MainWindow(QWidget):
         if (not force) and self._self_status_thread and self._self_status_thread.isRunning():
             return
 
-        self._self_status_thread = NetworkThread(None, None, {
-            "action": "status",
-            "login": login,
-            "token": token,
-        })
+        # heartbeat и отвечает online-статусом, и продлевает presence —
+        # следующий плановый heartbeat сдвигается.
+        self._service_last_run["heartbeat"] = time.monotonic()
 
         def _done(resp):
             try:
-                if isinstance(resp, dict) and resp.get("status") == "ok":
-                    self._self_status_failures = 0
-                    online = bool(resp.get("online", False))
-                    try:
-                        self.user_avatar.set_online(online, ring_color="#2f3136")
-                    except Exception:
-                        pass
-                    try:
-                        self.profile_page.update_status(online)
-                    except Exception:
-                        pass
-                else:
-                    self._self_status_failures += 1
-                    if self._self_status_failures >= 2:
-                        try:
-                            self.user_avatar.set_online(False, ring_color="#2f3136")
-                        except Exception:
-                            pass
-                        try:
-                            self.profile_page.update_status(False)
-                        except Exception:
-                            pass
+                self._apply_self_status(resp)
             finally:
                 self._self_status_thread = None
 
-        self._self_status_thread.finished.connect(_done)
-        self._self_status_thread.start()
+        self._self_status_thread = self.api.submit(
+            {**self._auth_payload, "action": "heartbeat"}, _done
+        )
+
+    def _apply_self_status(self, resp):
+        if isinstance(resp, dict) and resp.get("status") == "ok":
+            self._self_status_failures = 0
+            online = bool(resp.get("online", False))
+            try:
+                self.user_avatar.set_online(online, ring_color="#2f3136")
+            except Exception:
+                pass
+            try:
+                if self.profile_page is not None:
+                    self.profile_page.update_status(online)
+            except Exception:
+                pass
+        else:
+            self._self_status_failures += 1
+            if self._self_status_failures >= 2:
+                try:
+                    self.user_avatar.set_online(False, ring_color="#2f3136")
+                except Exception:
+                    pass
+                try:
+                    if self.profile_page is not None:
+                        self.profile_page.update_status(False)
+                except Exception:
+                    pass
 
     # ==================================================
     # ================== Навигация ======================
     # ==================================================
 
     def set_active_nav(self, active_btn):
-        for b in (self.btn_friends, self.btn_chats, self.btn_channels, self.btn_profile):
-            b.setProperty("active", b is active_btn)
-            b.style().unpolish(b); b.style().polish(b)
-
+        for b in self._nav_buttons:
+            new = b is active_btn
+            # Перерисовываем стиль только у кнопок, где свойство реально сменилось.
+            if b.property("active") == new:
+                continue
+            b.setProperty("active", new)
+            st = b.style(); st.unpolish(b); st.polish(b)
+
+
+    def _switch_tab(self, nav_btn, index: int):
+        """Переключить вкладку одним кадром.
+
+        Смена active у кнопок, смена страницы и старт/стоп её polling идут
+        при выключенных обновлениях окна — вместо промежуточных перерисовок
+        Qt выполнит одну в setUpdatesEnabled(True).
+        Повторный клик по уже открытой вкладке ничего не делает: False.
+        """
+        if self.stack.currentIndex() == index and nav_btn.property("active") is True:
+            return False
+        self.setUpdatesEnabled(False)
+        try:
+            self.set_active_nav(nav_btn)
+            self.stack.setCurrentIndex(index)
+            self._apply_polling_policy(force=True)
+        finally:
+            self.setUpdatesEnabled(True)
+        return True
 
     def show_friends(self):
-        self.set_active_nav(self.btn_friends)
-        self.stack.setCurrentWidget(self.friends_page)
-
         try:
             if self._current_call_peer():
-                self._sync_release_call_state(timeout_sec=0.5)
+                self._notify_control_async("release_call_state", timeout_sec=0.5)
+                self.current_call_user = None
             if self.voice_client:
-                self.voice_client.stop()
+                self._retire_voice_client(self.voice_client)
                 self.voice_client = None
             self._close_call_window()
         except Exception:
             pass
-        self._apply_polling_policy(force=True)
+        self._switch_tab(self.btn_friends, 0)
 
 
     def show_chats(self):
-        self.set_active_nav(self.btn_chats)
-        self.stack.setCurrentWidget(self.chats_page)
-        self._apply_polling_policy(force=True)
+        self._ensure_chats_page()
+        self._switch_tab(self.btn_chats, 1)
+
+    def _created_pages(self):
+        pages = (self.friends_page, self.chats_page, self.channels_page, self.profile_page)
+        return tuple(p for p in pages if p is not None)
+
+    def _install_lazy_page(self, index: int, page):
+        placeholder = self.stack.widget(index)
+        self.stack.insertWidget(index, page)
+        if placeholder is not None:
+            self.stack.removeWidget(placeholder)
+            placeholder.deleteLater()
+
+    def _ensure_chats_page(self):
+        if self.chats_page is None:
+            from ui.chats_page import ChatsPage
+            page = ChatsPage(self)
+            page.ctx = self.ctx
+            page.unread_counts = self._unread_counts
+            page.unread_total = self._unread_total
+            page.unread_pushed = bool(self._push is not None and self._push.connected)
+            # Подписка на обновление общего unread из ChatsPage
+            page.on_unread_total_changed = self.update_chats_badge
+            self._install_lazy_page(1, page)
+            self.chats_page = page
+        return self.chats_page
+
+    def _ensure_channels_page(self):
+        if self.channels_page is None:
+            from ui.channels_page import ChannelsPage
+            page = ChannelsPage(self)
+            # Подписка на количество входящих приглашений в каналы
+            page.on_invites_count_changed = self.update_channels_badge
+            self._install_lazy_page(2, page)
+            self.channels_page = page
+        return self.channels_page
+
+    def _ensure_profile_page(self):
+        if self.profile_page is None:
+            from ui.profile_page import ProfilePage
+            page = ProfilePage(self.ctx.login, self.ctx.nickname, self)
+            page.ctx = self.ctx
+            self._install_lazy_page(3, page)
+            self.profile_page = page
+        return self.profile_page
 
     def show_channels(self):
-        self.set_active_nav(self.btn_channels)
-        self.stack.setCurrentIndex(2)
-        self._apply_polling_policy(force=True)
+        self._ensure_channels_page()
+        self._switch_tab(self.btn_channels, 2)
 
 
     def show_profile(self):
-        self.set_active_nav(self.btn_profile)
-        self.stack.setCurrentIndex(3)
-        self._apply_polling_policy(force=True)
+        self._ensure_profile_page()
+        if not self._switch_tab(self.btn_profile, 3):
+            return
 
-        # Обновляем онлайн-статус профиля и мини-карточки
-        self.refresh_self_status(force=True)
+        # Обновляем онлайн-статус профиля и мини-карточки.
+        # Частые клики по вкладке не должны порождать новый поток на каждый клик:
+        # если проверка статуса уже идёт, её ответ и обновит профиль.
+        self.refresh_self_status()
 
     # ==================================================
     # ============== Переход к авторизации =============
@@ -794,145 +1151,166 @@ class MainWindow(QWidget):
             return
         self.is_logging_out = True
 
-        # Не блокируем UI: делаем короткий синхронный best-effort запрос,
-        # после чего в любом случае завершаем локальный переход на auth.
-        try:
-            self._sync_logout_session(timeout_sec=0.8)
-        except Exception:
-            pass
+        # Не блокируем UI: best-effort logout уходит в фоне, переход на auth — сразу.
+        self._notify_control_async("logout", timeout_sec=0.8)
         self._do_logout_transition()
 
-    def _sync_logout_session(self, timeout_sec: float = 0.8):
-        """Best-effort synchronous logout on server.
+    def _notify_control(self, action: str, timeout_sec: float, **extra) -> None:
+        """Best-effort control-действие текущей сессии без ожидания ответа.
 
-        Нужен, чтобы:
-        1) кнопка "Выйти" срабатывала предсказуемо даже при сбоях callback/thread,
-        2) presence у друзей снимался максимально быстро.
+        Ответ на эти запросы никто не читает, поэтому UI-поток ждёт только
+        отправку (по keep-alive ControlChannel окна), а не round trip.
         """
-        token = getattr(self.ctx, "session_token", "")
-        login = getattr(self.ctx, "login", "")
+        login, token = self._creds
         if not token or not login:
             return
-
-        payload = {
-            "action": "logout",
-            "login": login,
-            "token": token,
-        }
-
         try:
-            host, port = get_api_endpoint()
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(max(0.2, float(timeout_sec)))
-                s.connect((host, int(port)))
-                send_json_packet(s, payload)
-                _ = recv_json_packet(s)
+            self._control.notify({**self._auth_payload, **extra, "action": action}, timeout_sec)
         except Exception:
             pass
 
-    def _sync_set_presence_offline(self, timeout_sec: float = 0.7):
-        """Best-effort: пометить текущую сессию offline, сохранив токен.
+    def _notify_control_async(self, action: str, timeout_sec: float, **extra) -> None:
+        """_notify_control из фонового потока: UI не ждёт даже connect при плохой сети.
 
-        Используется при закрытии приложения (не logout), чтобы не держать
-        пользователя "онлайн" слишком долго до истечения ONLINE_WINDOW на сервере.
+        Payload собирается сразу, поэтому последующая смена/очистка контекста
+        (logout-переход) на запрос не влияет.
         """
-        token = getattr(self.ctx, "session_token", "")
-        login = getattr(self.ctx, "login", "")
+        login, token = self._creds
         if not token or not login:
             return
+        payload = {**self._auth_payload, **extra, "action": action}
+        control = self._control
 
-        payload = {
-            "action": "presence_offline",
-            "login": login,
-            "token": token,
-        }
-        try:
-            host, port = get_api_endpoint()
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(max(0.2, float(timeout_sec)))
-                s.connect((host, int(port)))
-                send_json_packet(s, payload)
-                _ = recv_json_packet(s)
-        except Exception:
-            pass
+        def _send():
+            try:
+                control.notify(payload, timeout_sec)
+            except Exception:
+                pass
 
-    def _do_logout_transition(self):
-        # Остановить автообновления
-        try:
-            if hasattr(self, "call_events_timer") and self.call_events_timer.isActive():
-                self.call_events_timer.stop()
-        except Exception:
-            pass
-        try:
-            if hasattr(self, "heartbeat_timer") and self.heartbeat_timer.isActive():
-                self.heartbeat_timer.stop()
-        except Exception:
-            pass
-        try:
-            if hasattr(self, "self_status_timer") and self.self_status_timer.isActive():
-                self.self_status_timer.stop()
-        except Exception:
-            pass
-        try:
-            if hasattr(self, "channel_invites_badge_timer") and self.channel_invites_badge_timer.isActive():
-                self.channel_invites_badge_timer.stop()
-        except Exception:
-            pass
-        try:
-            if getattr(self, "_self_status_thread", None) and self._self_status_thread.isRunning():
-                self._self_status_thread.abort()
-        except Exception:
-            pass
-        try:
-            if getattr(self, "_channel_invites_badge_thread", None) and self._channel_invites_badge_thread.isRunning():
-                self._channel_invites_badge_thread.abort()
-        except Exception:
-            pass
-        try:
-            if getattr(self, "_outgoing_call_thread", None) and self._outgoing_call_thread.isRunning():
-                self._outgoing_call_thread.abort()
-        except Exception:
-            pass
+        threading.Thread(target=_send, daemon=True).start()
 
+    def _shutdown_pages(self, wait_ms: int = 1000):
+        """Остановить фоновые запросы всех страниц с общим бюджетом ожидания.
+
+        Сначала все страницы получают сигнал остановки, и только потом идёт
+        ожидание: суммарное время ограничено wait_ms, а не wait_ms на страницу.
+        """
+        pages = self._created_pages()
+        for page in pages:
+            try:
+                page._alive = False
+                page.abort_requests()
+            except Exception:
+                pass
+
+        deadline = time.monotonic() + max(0, int(wait_ms)) / 1000.0
+        for page in pages:
+            try:
+                page.join_requests(deadline)
+            except Exception:
+                pass
+
+    # Таймеры и запросы окна, которые гасятся на любом пути завершения сессии.
+    _TEARDOWN_TIMERS = ("service_poll_timer", "_call_notice_timer")
+    _TEARDOWN_REQUESTS = (
+        "_service_poll_thread",
+        "_self_status_thread",
+        "_channel_invites_badge_thread",
+        "_outgoing_call_thread",
+        "_incoming_action_thread",
+        "_call_info_request",
+        "_unread_badge_request",
+    )
+
+    def _stop_service_activity(self):
+        """Остановить таймеры, push, запросы окна и polling страниц (logout/close).
+
+        Сигналы таймеров блокируются до stop(): timeout, уже стоящий в очереди
+        событий, не доставится посреди teardown. Блокировку снимает
+        reload_from_context() при следующем логине.
+        """
+        self._set_teardown_timers_blocked(True)
+        for name in self._TEARDOWN_TIMERS:
+            timer = getattr(self, name, None)
+            if timer is not None:
+                timer.stop()
+        self._stop_push_channel()
+        for name in self._TEARDOWN_REQUESTS:
+            req = getattr(self, name, None)
+            if req is not None and req.isRunning():
+                req.abort()
+
+        for page in (self.chats_page, self.channels_page):
+            if page is not None:
+                try:
+                    page.stop_auto_update()
+                except Exception:
+                    pass
+        self.friends_page.timer.stop()
+
+    def _set_teardown_timers_blocked(self, blocked: bool):
+        for name in self._TEARDOWN_TIMERS:
+            timer = getattr(self, name, None)
+            if timer is not None:
+                timer.blockSignals(blocked)
+
+    def _stop_channel_voice_session(self):
+        if self.channels_page is None:
+            return
         try:
-            self.chats_page.stop_auto_update()
-        except Exception:
-            pass
-        try:
-            self.channels_page.stop_auto_update()
+            self.channels_page.stop_voice_session(show_toast=False)
         except Exception:
             pass
 
+    def _teardown_session(self, *, app_exit: bool, wait_ms: int):
+        """Общая остановка сессии окна для logout и закрытия приложения.
+
+        app_exit: синхронно снять call-state/presence на сервере, остановить
+        ApiWorker и голос прямо в UI-потоке — после выхода процесса фоновые
+        потоки уже не доработают. При logout голос гасится в фоне.
+        """
         try:
-            if self.voice_client:
-                self.voice_client.stop()
-                self.voice_client = None
-            self._close_call_window()
             self._hide_incoming_inline()
             self._hide_call_notice()
-            if hasattr(self, "_call_notice_timer") and self._call_notice_timer.isActive():
-                self._call_notice_timer.stop()
-        except Exception:
-            pass
-        try:
-            if hasattr(self.channels_page, "stop_voice_session"):
-                self.channels_page.stop_voice_session(show_toast=False)
         except Exception:
             pass
+        if app_exit:
+            # Окно пропадает сразу: ограниченные по времени отправка
+            # shutdown_bundle и ожидание страниц идут уже без видимого "зависания".
+            try:
+                self.window().hide()
+            except Exception:
+                pass
+            self._sync_close_session(timeout_sec=0.9)
+
+        self._stop_service_activity()
+        if app_exit:
+            try:
+                self.api.stop()
+            except Exception:
+                pass
+
         try:
-            if hasattr(self.friends_page, "timer"):
-                self.friends_page.timer.stop()
+            if self.voice_client:
+                if app_exit:
+                    self.voice_client.stop()
+                else:
+                    self._retire_voice_client(self.voice_client)
+                self.voice_client = None
+            if not app_exit:
+                self._close_call_window()
         except Exception:
             pass
+        self._stop_channel_voice_session()
 
         # Корректно остановить запросы страниц
-        for page in (self.friends_page, self.chats_page, self.channels_page, self.profile_page):
-            try:
-                page._alive = False
-                if hasattr(page, "shutdown_requests"):
-                    page.shutdown_requests(wait_ms=1000)
-            except Exception:
-                pass
+        self._shutdown_pages(wait_ms=wait_ms)
+
+    def _do_logout_transition(self):
+        # Запросы страниц только отменяются, без ожидания: отменённый запрос
+        # не доставит callback, а процесс продолжает жить — потоки доработают
+        # в фоне. Экран входа появляется сразу.
+        self._teardown_session(app_exit=False, wait_ms=0)
 
         try:
             clear_config()
@@ -943,7 +1321,9 @@ class MainWindow(QWidget):
             UserContext().clear()
         except Exception:
             pass
-        self.ctx = self._snapshot_context(UserContext())
+        self._set_context(UserContext())
+        self._unread_counts = {}
+        self._unread_total = 0
         self.update_chats_badge(0)
         self.update_channels_badge(0)
 
@@ -959,23 +1339,11 @@ class MainWindow(QWidget):
     # ==================================================
 
 
-    def poll_call_events(self):
-        if not getattr(self.ctx, "login", None) or not getattr(self.ctx, "session_token", ""):
-            return
-        if self.call_poll_thread and self.call_poll_thread.isRunning():
-            return
-        self.call_poll_thread = NetworkThread(None, None, {
-            "action": "poll_events",
-            "login": self.ctx.login,
-            "token": self.ctx.session_token,
-        })
-        self.call_poll_thread.finished.connect(self.handle_call_events)
-        self.call_poll_thread.start()
-
     def handle_call_events(self, resp):
-        if resp.get("status") != "ok":
+        events = resp.get("events") if resp.get("status") == "ok" else None
+        if not events:
             return
-        for ev in resp.get("events", []):
+        for ev in events:
             et = ev.get("type")
             if et == "incoming_call":
                 from_user = ev.get("from_user")
@@ -1003,7 +1371,7 @@ class MainWindow(QWidget):
                 self._close_call_window()
                 try:
                     if self.voice_client:
-                        self.voice_client.stop()
+                        self._retire_voice_client(self.voice_client)
                         self.voice_client = None
                 except Exception:
                     pass
@@ -1015,24 +1383,58 @@ class MainWindow(QWidget):
                 self._close_call_window()
                 try:
                     if self.voice_client:
-                        self.voice_client.stop()
+                        self._retire_voice_client(self.voice_client)
                         self.voice_client = None
                 except Exception:
                     pass
                 self._show_call_notice(f"Звонок с {with_user} завершён", timeout_ms=2300)
 
+        # Состояние звонка влияет на фоновый режим polling.
+        self._apply_polling_policy()
+
     def _start_voice_for_peer(self, peer_login: str):
-        try:
-            if hasattr(self.channels_page, "stop_voice_session"):
-                self.channels_page.stop_voice_session(show_toast=False)
-        except Exception:
-            pass
+        self._stop_channel_voice_session()
+
+        # Новый клиент стартует только после остановки прошлого: его S|...|0
+        # иначе может прийти на сервер уже после J|/C| нового и снять новую
+        # пару, а эксклюзивный аудио-бэкенд не откроет потоки, пока старые живы.
+        # Остановка идёт в фоне, запуск — по сигналу обратно в UI-потоке.
+        self._voice_start_seq += 1
+        seq = self._voice_start_seq
+        old_vc, self.voice_client = self.voice_client, None
+        pending, self._voice_retire_thread = self._voice_retire_thread, None
+        if pending is not None and not pending.is_alive():
+            pending = None
+        if (old_vc is None or not old_vc.running) and pending is None:
+            self._launch_voice_client(peer_login)
+            return
+
+        def _stop_then_start():
+            if old_vc is not None:
+                try:
+                    old_vc.stop()
+                except Exception:
+                    pass
+            if pending is not None:
+                pending.join(3.0)
+            self._voice_client_retired.emit(seq, peer_login)
+
+        t = threading.Thread(target=_stop_then_start, daemon=True)
+        self._voice_retire_thread = t
+        t.start()
 
+    def _on_voice_client_retired(self, seq: int, peer_login: str):
+        # Пока старый клиент останавливался, звонок мог смениться или закончиться.
+        if seq != self._voice_start_seq or self._is_closing or self.is_logging_out:
+            return
+        if self.current_call_user != peer_login or self.voice_client is not None:
+            return
+        self._launch_voice_client(peer_login)
+
+    def _launch_voice_client(self, peer_login: str):
         try:
-            if self.voice_client:
-                self.voice_client.stop()
             v_host, v_port = get_voice_endpoint()
-            self.voice_client = VoiceClient(
+            self.voice_client = _get_voice_client_cls()(
                 login=self.ctx.login,
                 token=getattr(self.ctx, "session_token", ""),
                 host=v_host,
@@ -1042,16 +1444,34 @@ class MainWindow(QWidget):
         except Exception as e:
             self._show_call_notice(f"Не удалось запустить аудио: {e}", timeout_ms=2800)
 
+    def _retire_voice_client(self, vc):
+        """Остановить VoiceClient в фоне, не блокируя UI-поток.
+
+        stop() закрывает аудио-потоки PortAudio и сокет, что может занимать
+        заметное время; ссылку на клиент вызывающий код отпускает сразу.
+        Только для сброса/выхода: новый звонок дожидается этого потока
+        в _start_voice_for_peer.
+        """
+        if vc is None or not vc.running:
+            return
+
+        def _stop():
+            try:
+                vc.stop()
+            except Exception:
+                pass
+
+        t = threading.Thread(target=_stop, daemon=True)
+        self._voice_retire_thread = t
+        t.start()
+
     def _open_call_window(self, peer_login: str):
+        token = self._creds[1]
+        end_call_payload = {**self._auth_payload, "action": "end_call", "with_user": peer_login}
+
         def on_end_call():
             try:
-                t = NetworkThread(None, None, {
-                    "action": "end_call",
-                    "login": self.ctx.login,
-                    "with_user": peer_login,
-                    "token": self.ctx.session_token,
-                })
-                t.start()
+                self.api.submit(end_call_payload)
             except Exception:
                 pass
 
@@ -1067,7 +1487,7 @@ class MainWindow(QWidget):
             self.call_window._ending = True
             self.call_window.close()
 
-        self.call_window = ActiveCallWindow(
+        self.call_window = _get_call_window_cls()(
             my_login=self.ctx.login,
             peer_login=peer_login,
             peer_nickname=peer_login,
@@ -1079,22 +1499,29 @@ class MainWindow(QWidget):
             parent=self,
         )
         self.call_window.show()
+        window = self.call_window
+
+        # обновим имя/аватар из сервера; запрос для прошлого окна уже не нужен
+        if self._call_info_request is not None:
+            self._call_info_request.abort()
 
-        # обновим имя/аватар из сервера
-        info_t = NetworkThread(None, None, {
-            "action": "find_user",
-            "login": peer_login,
-            "token": self.ctx.session_token,
-        })
         def _apply_info(resp):
-            if resp.get("status") == "ok" and self.call_window:
+            self._call_info_request = None
+            # Окно могли закрыть или заменить новым звонком, пока шёл запрос.
+            if window is not self.call_window:
+                return
+            if resp.get("status") == "ok":
                 nick = resp.get("nickname") or peer_login
                 avatar = resp.get("avatar") or ""
-                self.call_window.name_lbl.setText(nick)
-                self.call_window.login_lbl.setText(peer_login)
-                self.call_window.avatar.set_avatar(path=avatar, login=peer_login, nickname=nick)
-        info_t.finished.connect(_apply_info)
-        info_t.start()
+                window.name_lbl.setText(nick)
+                window.login_lbl.setText(peer_login)
+                window.avatar.set_avatar(path=avatar, login=peer_login, nickname=nick)
+
+        self._call_info_request = self.api.submit({
+            "action": "find_user",
+            "login": peer_login,
+            "token": token,
+        }, _apply_info)
 
     def _close_call_window(self):
         try:
@@ -1116,34 +1543,17 @@ class MainWindow(QWidget):
             pass
         return None
 
-    def _sync_release_call_state(self, timeout_sec: float = 0.8):
-        """Best-effort synchronous call-state release.
+    def _sync_close_session(self, timeout_sec: float = 0.9):
+        """Best-effort: release_call_state + presence_offline при закрытии приложения.
 
-        Needed during app shutdown: async threads may not finish before process exits,
-        which could leave stale 'busy' state on the server.
+        Один пакет shutdown_bundle без ожидания ответа; затем соединение
+        закрывается с FIN, чтобы сервер не держал keep-alive до выхода процесса.
         """
-        token = getattr(self.ctx, "session_token", "")
-        login = getattr(self.ctx, "login", "")
-        if not token or not login:
-            return
-
-        payload = {
-            "action": "release_call_state",
-            "login": login,
-            "token": token,
-        }
-
         try:
-            host, port = get_api_endpoint()
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(max(0.2, float(timeout_sec)))
-                s.connect((host, int(port)))
-                send_json_packet(s, payload)
-                _ = recv_json_packet(s)
-        except Exception:
-            pass
+            self._notify_control("shutdown_bundle", timeout_sec, release_call=True, set_offline=True)
         finally:
             self.current_call_user = None
+            self._control.close()
 
     def resizeEvent(self, event):
         try:
@@ -1170,98 +1580,20 @@ class MainWindow(QWidget):
             self._apply_polling_policy()
 
     def closeEvent(self, event):
-        if self._is_closing:
+        if not self._begin_app_close():
             event.accept()
             return
-        self._is_closing = True
 
         # Если это logout-переход на auth — не выходим из приложения
         if self.is_logging_out:
             event.accept()
             return
 
-        # Это закрытие приложения на крестик
-        try:
-            self._hide_incoming_inline()
-            self._hide_call_notice()
-            if hasattr(self, "_call_notice_timer") and self._call_notice_timer.isActive():
-                self._call_notice_timer.stop()
-        except Exception:
-            pass
-
-        try:
-            # Важно: на закрытии приложения очищаем call-state синхронно,
-            # иначе сервер может оставить пару как "занят".
-            self._sync_release_call_state(timeout_sec=0.9)
-        except Exception:
-            pass
-
-        try:
-            # Сохраняем токен для auto-login, но явно снимаем online presence.
-            self._sync_set_presence_offline(timeout_sec=0.7)
-        except Exception:
-            pass
-
-        try:
-            if hasattr(self, "call_events_timer") and self.call_events_timer.isActive():
-                self.call_events_timer.stop()
-        except Exception:
-            pass
-        try:
-            if hasattr(self, "heartbeat_timer") and self.heartbeat_timer.isActive():
-                self.heartbeat_timer.stop()
-        except Exception:
-            pass
-        try:
-            if getattr(self, "_channel_invites_badge_thread", None) and self._channel_invites_badge_thread.isRunning():
-                self._channel_invites_badge_thread.abort()
-        except Exception:
-            pass
-        try:
-            if hasattr(self, "self_status_timer") and self.self_status_timer.isActive():
-                self.self_status_timer.stop()
-        except Exception:
-            pass
-        try:
-            if getattr(self, "_self_status_thread", None) and self._self_status_thread.isRunning():
-                self._self_status_thread.abort()
-        except Exception:
-            pass
-
-        try:
-            self.chats_page.stop_auto_update()
-        except Exception:
-            pass
-        try:
-            self.channels_page.stop_auto_update()
-        except Exception:
-            pass
-
-        try:
-            if self.voice_client:
-                self.voice_client.stop()
-                self.voice_client = None
-            self._hide_incoming_inline()
-            self._hide_call_notice()
-            if hasattr(self, "_call_notice_timer") and self._call_notice_timer.isActive():
-                self._call_notice_timer.stop()
-        except Exception:
-            pass
-
-        try:
-            if hasattr(self.friends_page, "timer"):
-                self.friends_page.timer.stop()
-        except Exception:
-            pass
-
-        # Остановить фоновые запросы страниц
-        for page in (self.friends_page, self.chats_page, self.channels_page, self.profile_page):
-            try:
-                page._alive = False
-                if hasattr(page, "shutdown_requests"):
-                    page.shutdown_requests(wait_ms=1000)
-            except Exception:
-                pass
+        # Это закрытие приложения на крестик.
+        # Важно: call-state очищается синхронно, иначе сервер может оставить
+        # пару как "занят". Токен сохраняем для auto-login, но явно снимаем
+        # online presence — оба действия одним пакетом.
+        self._teardown_session(app_exit=True, wait_ms=1000)
 
         # Не делаем явный logout при закрытии приложения: токен остаётся
         # в конфиге и сессия может быть восстановлена при следующем запуске.
@@ -1278,120 +1610,61 @@ class MainWindow(QWidget):
         и перезапускает страницы после логина/перелогина.
         """
         from user_context import UserContext
-        self.ctx = self._snapshot_context(UserContext())
+        self._set_context(UserContext())
         self.is_logging_out = False
 
         # После logout страницы переводятся в _alive=False.
-        # При следующем логине обязательно реанимируем их.
-        for page in (self.friends_page, self.chats_page, self.channels_page, self.profile_page):
-            try:
-                page._alive = True
-            except Exception:
-                pass
+        # При следующем логине реанимируем их и передаём новый контекст.
+        for page in self._created_pages():
+            page._alive = True
+            page.ctx = self.ctx
 
-        # Восстанавливаем сервисные таймеры (интервалы задаст policy).
-        try:
-            if hasattr(self, "call_events_timer") and not self.call_events_timer.isActive():
-                self.call_events_timer.start()
-        except Exception:
-            pass
-        try:
-            if hasattr(self, "heartbeat_timer") and not self.heartbeat_timer.isActive():
-                self.heartbeat_timer.start()
-        except Exception:
-            pass
+        # Восстанавливаем сервисный polling (интервалы задаст policy).
+        # Новая сессия — все пункты poll_batch считаются просроченными.
+        self._set_teardown_timers_blocked(False)
+        self._service_last_run = {}
         try:
-            if hasattr(self, "channel_invites_badge_timer") and not self.channel_invites_badge_timer.isActive():
-                self.channel_invites_badge_timer.start()
+            self._schedule_service_poll()
         except Exception:
             pass
+        self._start_push_channel()
 
         # Обновляем профиль/мини-карточку
         try:
-            self.profile_page.login = self.ctx.login
-            self.profile_page.nickname = self.ctx.nickname
-            self.profile_page.nickname_edit.setText(self.ctx.nickname)
-            if hasattr(self.profile_page, "login_label"):
-                self.profile_page.login_label.setText(self.ctx.login or "—")
-            self.profile_page.avatar_path = self.ctx.avatar or ""
-            self.profile_page._apply_avatar(self.profile_page.avatar_path)
-            if hasattr(self.profile_page, "set_user_data"):
+            if self.profile_page is not None:
                 self.profile_page.set_user_data(self.ctx.login, self.ctx.nickname, getattr(self.ctx, "avatar", ""))
 
-            self.user_nick_lbl.setText(self.ctx.nickname or "Гость")
-            self.user_login_lbl.setText(self.ctx.login or "")
+            self.set_user_card_text(self.ctx.nickname, self.ctx.login)
             self.user_avatar.set_avatar(path=getattr(self.ctx, "avatar", ""), login=self.ctx.login, nickname=self.ctx.nickname)
             self.user_avatar.set_online(None if not self.ctx.login else False, ring_color="#2f3136")
         except Exception:
             pass
 
-        # Передаем новый контекст дочерним страницам
-        try:
-            self.friends_page.ctx = self.ctx
-        except Exception:
-            pass
-
-        try:
-            self.chats_page.ctx = self.ctx
-        except Exception:
-            pass
-
-        try:
-            self.channels_page.ctx = self.ctx
-        except Exception:
-            pass
-
-        try:
-            self.profile_page.ctx = self.ctx
-        except Exception:
-            pass
-
-        try:
-            if hasattr(self, "self_status_timer") and not self.self_status_timer.isActive():
-                self.self_status_timer.start()
-        except Exception:
-            pass
         self.refresh_self_status(force=True)
         self.poll_channel_invites_badge(force=True)
 
         if full_reset:
             # Сброс страниц под нового пользователя
             try:
-                if hasattr(self.friends_page, "reset_for_user"):
-                    self.friends_page.reset_for_user()
-                else:
-                    self.friends_page.clear_list()
-                    self.friends_page._loading_friends = False
-                    self.friends_page._loading_requests = False
-                    self.friends_page._found_user = None
+                self.friends_page.reset_for_user()
                 self.friends_page.refresh()
             except Exception:
                 pass
 
-            try:
-                if hasattr(self.chats_page, "reset_for_user"):
+            if self.chats_page is not None:
+                try:
                     self.chats_page.reset_for_user()
-                else:
-                    self.chats_page.stop_auto_update()
-                    self.chats_page.active_friend = None
-                    self.chats_page._loading_friends = False
-                    self.chats_page._loading_messages = False
-                    self.chats_page._sending = False
-                    self.chats_page._loading_unread = False
-                    self.chats_page.unread_counts = {}
-                    self.chats_page.unread_total = 0
-                    self.chats_page.chat_header.setText("Выберите друга")
-                    self.chats_page._clear_friends()
-                    self.chats_page._clear_messages()
-                self.chats_page.start_auto_update(force_refresh=True)  # подтянет unread + friends
-            except Exception:
-                pass
+                    self.chats_page.start_auto_update(force_refresh=True)  # подтянет unread + friends
+                except Exception:
+                    pass
+            # Бейдж "Чаты" нужен сразу, даже если вкладка не открыта.
+            self.refresh_unread_badge()
 
-            try:
-                if hasattr(self.channels_page, "reset_for_user"):
+            if self.channels_page is not None:
+                try:
                     self.channels_page.reset_for_user()
-            except Exception:
-                pass
+                except Exception:
+                    pass
 
         # По умолчанию открываем друзей
         self.show_friends()
@@ -1402,73 +1675,19 @@ class MainWindow(QWidget):
         """
         Вызывается контейнером AppWindow при закрытии приложения.
         """
-        try:
-            self._sync_release_call_state(timeout_sec=0.9)
-        except Exception:
-            pass
-
-        try:
-            self._sync_set_presence_offline(timeout_sec=0.7)
-        except Exception:
-            pass
-
-        try:
-            if hasattr(self, "call_events_timer") and self.call_events_timer.isActive():
-                self.call_events_timer.stop()
-        except Exception:
-            pass
-        try:
-            if hasattr(self, "heartbeat_timer") and self.heartbeat_timer.isActive():
-                self.heartbeat_timer.stop()
-        except Exception:
-            pass
-        try:
-            if hasattr(self, "channel_invites_badge_timer") and self.channel_invites_badge_timer.isActive():
-                self.channel_invites_badge_timer.stop()
-        except Exception:
-            pass
-        try:
-            if hasattr(self, "self_status_timer") and self.self_status_timer.isActive():
-                self.self_status_timer.stop()
-        except Exception:
-            pass
-        try:
-            if getattr(self, "_self_status_thread", None) and self._self_status_thread.isRunning():
-                self._self_status_thread.abort()
-        except Exception:
-            pass
-
-        try:
-            self.chats_page.stop_auto_update()
-        except Exception:
-            pass
-        try:
-            self.channels_page.stop_auto_update()
-        except Exception:
-            pass
+        if not self._begin_app_close():
+            return
+        self._teardown_session(app_exit=True, wait_ms=1200)
 
-        try:
-            if self.voice_client:
-                self.voice_client.stop()
-                self.voice_client = None
-        except Exception:
-            pass
-        try:
-            if hasattr(self.channels_page, "stop_voice_session"):
-                self.channels_page.stop_voice_session(show_toast=False)
-        except Exception:
-            pass
-        try:
-            if hasattr(self.friends_page, "timer"):
-                self.friends_page.timer.stop()
-        except Exception:
-            pass
+    def _begin_app_close(self) -> bool:
+        """Отметить начало закрытия; False, если его уже начал другой путь.
 
-        for page in (self.friends_page, self.chats_page, self.channels_page, self.profile_page):
-            try:
-                page._alive = False
-                if hasattr(page, "shutdown_requests"):
-                    page.shutdown_requests(wait_ms=1200)
-            except Exception:
-                pass
+        Закрытие приходит и через closeEvent, и через AppWindow.prepare_to_close_app —
+        синхронный teardown (shutdown_bundle, ожидание страниц) должен пройти один раз.
+        Оба пути выполняются в UI-потоке, так что флага-bool достаточно.
+        """
+        if self._is_closing:
+            return False
+        self._is_closing = True
+        return True
 
@@ -1,14 +1,44 @@
 from __future__ import annotations
 
-from PySide6.QtCore import QObject, QEvent, QPropertyAnimation, QEasingCurve
+from PySide6.QtCore import QObject, QEvent, QPropertyAnimation, QEasingCurve, QTimer
 from PySide6.QtWidgets import QGraphicsOpacityEffect, QWidget
 
 
+# Enter/Leave/Press/Release often arrive in bursts (cursor grazing an edge,
+# a click right after hover). Targets are collected here and applied once per
+# frame by a single shared timer, so a burst restarts the animation only once.
+_COALESCE_MS = 8
+_pending_filters: set = set()
+_flush_timer: QTimer | None = None
+
+
+def _flush_pending() -> None:
+    filters = list(_pending_filters)
+    _pending_filters.clear()
+    for flt in filters:
+        try:
+            flt._apply_pending()
+        except RuntimeError:
+            # Widget was destroyed while its target was pending.
+            pass
+
+
+def _schedule_flush() -> None:
+    global _flush_timer
+    if _flush_timer is None:
+        _flush_timer = QTimer()
+        _flush_timer.setSingleShot(True)
+        _flush_timer.setInterval(_COALESCE_MS)
+        _flush_timer.timeout.connect(_flush_pending)
+    if not _flush_timer.isActive():
+        _flush_timer.start()
+
+
 class _OpacityFeedbackFilter(QObject):
     """Lightweight hover/press feedback with tiny opacity animation.
 
-    No timers or continuous animations are used, so this stays cheap even on
-    lower-end devices.
+    No per-widget timers or continuous animations are used, so this stays
+    cheap even on lower-end devices.
     """
 
     def __init__(
@@ -26,24 +56,43 @@ class _OpacityFeedbackFilter(QObject):
         self._duration = max(40, int(duration_ms))
         self._entered = False
         self._pressed_now = False
+        self._pending_target: float | None = None
 
+        # An enabled QGraphicsOpacityEffect renders the widget through an
+        # offscreen pixmap on every repaint. Our own effect therefore stays
+        # disabled while the widget is at full opacity and is switched on only
+        # for the hover/press state and the transitions around it.
         effect = target.graphicsEffect()
-        if not isinstance(effect, QGraphicsOpacityEffect):
+        self._owns_effect = not isinstance(effect, QGraphicsOpacityEffect)
+        if self._owns_effect:
             effect = QGraphicsOpacityEffect(target)
             effect.setOpacity(1.0)
+            effect.setEnabled(False)
             target.setGraphicsEffect(effect)
         self._effect: QGraphicsOpacityEffect = effect
 
         self._anim = QPropertyAnimation(self._effect, b"opacity", target)
         self._anim.setDuration(self._duration)
         self._anim.setEasingCurve(QEasingCurve.OutCubic)
+        self._anim.finished.connect(self._on_anim_finished)
 
     def _animate_to(self, value: float) -> None:
+        self._pending_target = max(0.35, min(1.0, float(value)))
+        _pending_filters.add(self)
+        _schedule_flush()
+
+    def _apply_pending(self) -> None:
+        value, self._pending_target = self._pending_target, None
+        if value is None:
+            return
         try:
-            value = max(0.35, min(1.0, float(value)))
-            if abs(self._effect.opacity() - value) < 0.002:
+            if self._anim.state() == QPropertyAnimation.Running:
+                if abs(float(self._anim.endValue()) - value) < 0.002:
+                    return
+            elif abs(self._effect.opacity() - value) < 0.002:
                 return
             self._anim.stop()
+            self._effect.setEnabled(True)
             self._anim.setStartValue(self._effect.opacity())
             self._anim.setEndValue(value)
             self._anim.start()
@@ -51,10 +100,18 @@ class _OpacityFeedbackFilter(QObject):
             # Silent fallback in case some platform style blocks effects.
             try:
                 self._effect.setOpacity(value)
+                self._on_anim_finished()
             except Exception:
                 pass
 
+    def _on_anim_finished(self) -> None:
+        if self._owns_effect and self._effect.opacity() >= 0.998:
+            self._effect.setEnabled(False)
+
     def eventFilter(self, obj, event):
+        if self._target.graphicsEffect() is not self._effect:
+            # Effect was replaced by someone else; animating ours is wasted work.
+            return False
         et = event.type()
 
         if et == QEvent.Enter:
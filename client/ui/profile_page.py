@@ -1,20 +1,30 @@
 import os
-import shutil
+import threading
 
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QLineEdit,
     QPushButton, QFileDialog, QFrame
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, Signal
 
 from config import load_config, save_config, clear_config
 from utils.thread_safe_mixin import ThreadSafeMixin
-from ui.avatar_widget import AvatarLabel
+from ui.avatar_widget import AVATARS_DIR, CLIENT_DIR, AvatarLabel, find_local_avatar, read_image_scaled
 from ui.toast import InlineToast
 from user_context import UserContext
 
 
+_avatars_dir_ready = False
+
+# Аватары показываются максимум в 110 px; запас x2 под HiDPI.
+_AVATAR_STORE_PX = 256
+_PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+
 class ProfilePage(QWidget, ThreadSafeMixin):
+    # (исходный абсолютный путь, payload update_profile) — из фонового потока
+    _avatar_normalized = Signal(str, object)
+
     def __init__(self, login, nickname, parent_window=None):
         super().__init__(parent_window)
 
@@ -24,12 +34,22 @@ class ProfilePage(QWidget, ThreadSafeMixin):
 
         # Может быть абсолютным (после выбора файла) или относительным (avatars/xxx.jpg)
         self.avatar_path = ""
+        # Папка, из которой в прошлый раз выбирали аватар (config: last_avatar_dir)
+        self._last_avatar_dir = ""
 
         # Для ThreadSafeMixin
-        self._threads = []
+        self._threads = set()
         self._alive = True
+        # Редкие запросы профиля идут через постоянный ApiWorker главного окна.
+        self._api_worker = getattr(parent_window, "api", None)
 
-        self._build_ui()
+        # Карточку собираем при выключенных обновлениях: одна перерисовка в конце.
+        self.setUpdatesEnabled(False)
+        try:
+            self._build_ui()
+        finally:
+            self.setUpdatesEnabled(True)
+        self._avatar_normalized.connect(self._on_avatar_normalized)
         self._load_initial_profile_data()
 
     # ==================================================
@@ -56,7 +76,8 @@ class ProfilePage(QWidget, ThreadSafeMixin):
 
         # Статус
         self.status_label = QLabel("● Offline")
-        self.status_label.setObjectName("ProfileStatusOffline")
+        self.status_label.setObjectName("ProfileStatus")
+        self.status_label.setProperty("online", "false")
         self.status_label.setAlignment(Qt.AlignCenter)
         card_l.addWidget(self.status_label)
 
@@ -94,10 +115,10 @@ class ProfilePage(QWidget, ThreadSafeMixin):
         btn_avatar.clicked.connect(self.choose_avatar)
         card_l.addWidget(btn_avatar)
 
-        btn_save = QPushButton("Сохранить изменения")
-        btn_save.setObjectName("ProfilePrimaryButton")
-        btn_save.clicked.connect(self.save_changes)
-        card_l.addWidget(btn_save)
+        self.btn_save = QPushButton("Сохранить изменения")
+        self.btn_save.setObjectName("ProfilePrimaryButton")
+        self.btn_save.clicked.connect(self.save_changes)
+        card_l.addWidget(self.btn_save)
 
         btn_logout = QPushButton("Выйти из аккаунта")
         btn_logout.setObjectName("ProfileDangerButton")
@@ -135,39 +156,52 @@ class ProfilePage(QWidget, ThreadSafeMixin):
     # ================== Avatar logic ==================
     # ==================================================
 
-    def _client_dir(self):
-        # client/ui/profile_page.py -> client
-        return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
     def _avatars_dir(self):
-        path = os.path.join(self._client_dir(), "avatars")
-        os.makedirs(path, exist_ok=True)
-        return path
+        global _avatars_dir_ready
+        if not _avatars_dir_ready:
+            os.makedirs(AVATARS_DIR, exist_ok=True)
+            _avatars_dir_ready = True
+        return AVATARS_DIR
 
     def _to_abs_avatar_path(self, path: str) -> str:
         if not path:
             return ""
         if os.path.isabs(path):
             return path
-        return os.path.join(self._client_dir(), path)
+        return os.path.join(CLIENT_DIR, path)
 
     def _normalize_avatar_to_project(self, source_path: str) -> str:
         """
         Копируем выбранный файл в client/avatars/<login>.<ext>
         Возвращаем относительный путь вида: avatars/<login>.<ext>
+
+        Большие изображения один раз уменьшаются до _AVATAR_STORE_PX по короткой
+        стороне: дальше каждая загрузка аватара декодирует и масштабирует уже
+        маленький файл, а не исходник в несколько мегапикселей.
         """
-        if not source_path or not os.path.exists(source_path):
+        if not source_path:
             return ""
-
-        ext = os.path.splitext(source_path)[1].lower()
-        if ext not in (".png", ".jpg", ".jpeg"):
-            ext = ".jpg"
+        # Расширение — по сигнатуре файла, а не по имени (x.PNG.jpg, png под .jpg).
+        try:
+            with open(source_path, "rb") as f:
+                head = f.read(8)
+        except OSError:
+            return ""
+        ext = ".png" if head.startswith(_PNG_MAGIC) else ".jpg"
 
         dst_name = f"{self.login}{ext}"
         dst_abs = os.path.join(self._avatars_dir(), dst_name)
 
+        # Большой исходник декодируется сразу в уменьшенном виде (масштаб при чтении).
+        image = read_image_scaled(source_path, _AVATAR_STORE_PX)
+        if not image.isNull() and min(image.width(), image.height()) == _AVATAR_STORE_PX:
+            if image.save(dst_abs, None, 90):
+                return f"avatars/{dst_name}"
+
+        import shutil  # нужен только при смене аватара
+
         try:
-            shutil.copy2(source_path, dst_abs)
+            shutil.copyfile(source_path, dst_abs)
         except Exception:
             return ""
 
@@ -182,41 +216,31 @@ class ProfilePage(QWidget, ThreadSafeMixin):
 
     def _sync_context_and_parent(self):
         """Синхронизировать ник/аватар после сохранения профиля без перезапуска окна."""
-        try:
-            ctx = UserContext()
-            ctx.login = self.login or ctx.login
-            ctx.nickname = self.nickname
-            if self.avatar_path:
-                ctx.avatar = self.avatar_path
-        except Exception:
-            pass
+        ctx = UserContext()
+        ctx.login = self.login or ctx.login
+        ctx.nickname = self.nickname
+        if self.avatar_path:
+            ctx.avatar = self.avatar_path
 
         pw = self.parent_window
         if pw is None:
             return
 
-        try:
-            if hasattr(pw, "ctx"):
-                pw.ctx.login = self.login or getattr(pw.ctx, "login", "")
-                pw.ctx.nickname = self.nickname
-                if self.avatar_path:
-                    pw.ctx.avatar = self.avatar_path
-        except Exception:
-            pass
+        pw_ctx = getattr(pw, "ctx", None)
+        if pw_ctx is not None and pw_ctx is not ctx:
+            pw_ctx.login = self.login or getattr(pw_ctx, "login", "")
+            pw_ctx.nickname = self.nickname
+            if self.avatar_path:
+                pw_ctx.avatar = self.avatar_path
 
-        try:
-            if hasattr(pw, "user_nick_lbl"):
-                pw.user_nick_lbl.setText(self.nickname or "Гость")
-            if hasattr(pw, "user_login_lbl"):
-                pw.user_login_lbl.setText(self.login or "")
-            if hasattr(pw, "user_avatar"):
-                pw.user_avatar.set_avatar(
-                    path=self.avatar_path,
-                    login=self.login,
-                    nickname=self.nickname,
-                )
-        except Exception:
-            pass
+        if hasattr(pw, "set_user_card_text"):
+            pw.set_user_card_text(self.nickname, self.login)
+        if hasattr(pw, "user_avatar"):
+            pw.user_avatar.set_avatar(
+                path=self.avatar_path,
+                login=self.login,
+                nickname=self.nickname,
+            )
 
     def set_user_data(self, login, nickname, avatar=""):
         """
@@ -225,20 +249,12 @@ class ProfilePage(QWidget, ThreadSafeMixin):
         self.login = login or ""
         self.nickname = nickname or ""
         self.avatar_path = avatar or ""
+        # Ответ на сохранение прошлой сессии мог быть отменён вместе с её запросами.
+        self.btn_save.setEnabled(True)
 
-        try:
-            self.login_label.setText(self.login or "—")
-        except Exception:
-            pass
-        try:
-            self.nickname_edit.setText(self.nickname)
-            self.login_label.setText(self.login or "—")
-        except Exception:
-            pass
-        try:
-            self._apply_avatar(self.avatar_path)
-        except Exception:
-            pass
+        self.login_label.setText(self.login or "—")
+        self.nickname_edit.setText(self.nickname)
+        self._apply_avatar(self.avatar_path)
 
     def _load_initial_profile_data(self):
         """
@@ -247,6 +263,7 @@ class ProfilePage(QWidget, ThreadSafeMixin):
         2) fallback avatars/<login>.(png/jpg/jpeg)
         """
         cfg = load_config()
+        self._last_avatar_dir = cfg.get("last_avatar_dir", "") or ""
 
         # Логин из контекста приоритетный, но если пустой — берем из config
         if (not self.login) and cfg.get("login"):
@@ -257,17 +274,11 @@ class ProfilePage(QWidget, ThreadSafeMixin):
         if not self.nickname and cfg.get("nickname"):
             self.nickname = cfg.get("nickname", "")
             self.nickname_edit.setText(self.nickname)
-            self.login_label.setText(self.login or "—")
 
         self.avatar_path = cfg.get("avatar", "") or ""
 
         if not self.avatar_path:
-            for ext in (".png", ".jpg", ".jpeg"):
-                rel = f"avatars/{self.login}{ext}"
-                abs_p = self._to_abs_avatar_path(rel)
-                if os.path.exists(abs_p):
-                    self.avatar_path = rel
-                    break
+            self.avatar_path = find_local_avatar(self.login)
 
         self._apply_avatar(self.avatar_path)
 
@@ -276,15 +287,25 @@ class ProfilePage(QWidget, ThreadSafeMixin):
     # ==================================================
 
     def choose_avatar(self):
+        # Стартуем с прошлой папки, а не с cwd; без извлечения иконок для каждой папки.
+        start_dir = self._last_avatar_dir if os.path.isdir(self._last_avatar_dir) else ""
         path, _ = QFileDialog.getOpenFileName(
             self,
             "Выберите аватар",
-            "",
-            "Images (*.png *.jpg *.jpeg)"
+            start_dir,
+            "Images (*.png *.jpg *.jpeg)",
+            options=QFileDialog.DontResolveSymlinks | QFileDialog.DontUseCustomDirectoryIcons,
         )
         if not path:
             return
 
+        last_dir = os.path.dirname(path)
+        if last_dir != self._last_avatar_dir:
+            self._last_avatar_dir = last_dir
+            cfg = load_config()
+            cfg["last_avatar_dir"] = last_dir
+            save_config(cfg)
+
         self.avatar_path = path  # пока абсолютный путь (до сохранения)
         self._apply_avatar(self.avatar_path)
 
@@ -294,25 +315,43 @@ class ProfilePage(QWidget, ThreadSafeMixin):
             self.show_toast("Никнейм не может быть пустым", msec=2800)
             return
 
-        # Если выбран файл из проводника (абсолютный путь), копируем в client/avatars
-        avatar_for_server = self.avatar_path
-        if self.avatar_path and os.path.isabs(self.avatar_path):
-            normalized = self._normalize_avatar_to_project(self.avatar_path)
-            if normalized:
-                self.avatar_path = normalized
-                avatar_for_server = normalized
-
         data = {
             "action": "update_profile",
             "login": self.login,
             "nickname": nickname,
             "password": self.password_edit.text().strip(),  # можно пустым
-            "avatar": avatar_for_server
+            "avatar": self.avatar_path
         }
+        self.btn_save.setEnabled(False)
+
+        # Если выбран файл из проводника (абсолютный путь), копируем в client/avatars.
+        # Чтение/масштабирование/запись файла идут в фоне, чтобы не подвешивать UI;
+        # запрос уходит из _on_avatar_normalized.
+        if self.avatar_path and os.path.isabs(self.avatar_path):
+            source = self.avatar_path
+
+            def _normalize():
+                normalized = self._normalize_avatar_to_project(source)
+                if normalized:
+                    data["avatar"] = normalized
+                self._avatar_normalized.emit(source, data)
+
+            threading.Thread(target=_normalize, daemon=True).start()
+            return
 
         self.start_request(data, self.handle_save_response)
 
+    def _on_avatar_normalized(self, source: str, data):
+        # Страница закрыта или пользователь сменился, пока копировался файл.
+        if not self._alive or data["login"] != self.login:
+            return
+        # Пока шло копирование, мог быть выбран другой файл — его не затираем.
+        if data["avatar"] != source and self.avatar_path == source:
+            self.avatar_path = data["avatar"]
+        self.start_request(data, self.handle_save_response)
+
     def handle_save_response(self, resp):
+        self.btn_save.setEnabled(True)
         if resp.get("status") == "ok":
             self.nickname = self.nickname_edit.text().strip()
 
@@ -334,14 +373,14 @@ class ProfilePage(QWidget, ThreadSafeMixin):
             self.show_toast(resp.get("message", "Не удалось обновить профиль"), msec=3200)
 
     def update_status(self, online: bool):
-        if online:
-            self.status_label.setText("● Online")
-            self.status_label.setObjectName("ProfileStatusOnline")
-            self.status_label.style().unpolish(self.status_label); self.status_label.style().polish(self.status_label)
-        else:
-            self.status_label.setText("● Offline")
-            self.status_label.setObjectName("ProfileStatusOffline")
-            self.status_label.style().unpolish(self.status_label); self.status_label.style().polish(self.status_label)
+        # Вызывается на каждый heartbeat: repolish только при смене статуса.
+        value = "true" if online else "false"
+        if self.status_label.property("online") == value:
+            return
+        self.status_label.setProperty("online", value)
+        self.status_label.setText("● Online" if online else "● Offline")
+        self.status_label.style().unpolish(self.status_label)
+        self.status_label.style().polish(self.status_label)
 
     def logout(self):
         # Используем единый пайплайн логаута (останавливает таймеры/voice и чистит контекст)
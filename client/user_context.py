@@ -1,15 +1,10 @@
 class UserContext:
-    _instance = None
+    # Фиксированный набор полей: доступ без __dict__, лишние атрибуты — ошибка.
+    __slots__ = ("login", "nickname", "avatar", "session_token", "token_expires_at")
 
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(UserContext, cls).__new__(cls)
-            cls._instance.login = ""
-            cls._instance.nickname = ""
-            cls._instance.avatar = ""
-            cls._instance.session_token = ""
-            cls._instance.token_expires_at = ""  # ISO string
-        return cls._instance
+        # Единственный экземпляр создаётся при импорте модуля.
+        return _CTX
 
     def set_user(self, login: str, nickname: str, avatar: str = "", session_token: str = "", token_expires_at: str = ""):
         self.login = login or ""
@@ -23,4 +18,8 @@ class UserContext:
         self.nickname = ""
         self.avatar = ""
         self.session_token = ""
-        self.token_expires_at = ""
+        self.token_expires_at = ""  # ISO string
+
+
+_CTX = object.__new__(UserContext)
+_CTX.clear()
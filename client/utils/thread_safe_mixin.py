@@ -1,9 +1,19 @@
+import time
+
+# Действия, где from_user — это "текущий пользователь" и его можно подставить.
+_FROM_USER_ACTIONS = frozenset({"send_friend_request", "send_message", "call_user", "get_messages"})
+
+
 class ThreadSafeMixin:
     """Универсальный mixin для безопасной работы с NetworkThread (threading-based).
 
     Ожидает:
-    - self._threads: list
+    - self._threads: set
     - self._alive: bool
+
+    Опционально:
+    - self._api_worker: ApiWorker окна. Тогда запросы без явного host/port
+      идут через его постоянное соединение, без потока и handshake на запрос.
     """
 
     def start_request(self, data, callback, host=None, port=None):
@@ -31,37 +41,61 @@ class ThreadSafeMixin:
 
             # from_user должен автозаполняться только там,
             # где это действительно "текущий пользователь".
-            if action in {"send_friend_request", "send_message", "call_user", "get_messages"}:
+            if action in _FROM_USER_ACTIONS:
                 if "from_user" not in payload and login:
                     payload["from_user"] = login
 
-        t = NetworkThread(host, port, payload)
-        self._threads.append(t)
-
         def done(resp):
             if not getattr(self, "_alive", True):
-                if t in self._threads:
-                    self._threads.remove(t)
+                self._threads.discard(t)
                 return
 
             try:
                 callback(resp)
             finally:
-                if t in self._threads:
-                    self._threads.remove(t)
+                self._threads.discard(t)
+
+        worker = getattr(self, "_api_worker", None)
+        if worker is not None and host is None and port is None:
+            t = worker.submit(payload, done)
+            self._threads.add(t)
+            return
 
+        t = NetworkThread(host, port, payload)
+        self._threads.add(t)
         t.finished.connect(done)
         t.start()
 
-    def shutdown_requests(self, wait_ms=2000):
+    def abort_requests(self):
+        """Пометить все активные запросы как отменённые, не дожидаясь их."""
         for t in list(getattr(self, "_threads", [])):
             try:
                 if hasattr(t, "abort"):
                     t.abort()
                 t.requestInterruption()
-                if t.isRunning():
-                    t.wait(wait_ms)
             except Exception:
                 pass
 
-        self._threads = [t for t in self._threads if t.isRunning()]
+    def shutdown_requests(self, wait_ms=2000):
+        """Отменить запросы и дождаться их в пределах общего бюджета wait_ms."""
+        self.abort_requests()
+        self.join_requests(time.monotonic() + max(0, int(wait_ms)) / 1000.0)
+
+    def join_requests(self, deadline: float):
+        """Дождаться уже отменённых запросов до момента deadline (time.monotonic()).
+
+        Общий deadline позволяет нескольким владельцам ждать параллельно:
+        сначала abort_requests() у всех, затем join_requests() с одним сроком.
+        """
+        for t in list(getattr(self, "_threads", [])):
+            try:
+                if not t.isRunning():
+                    continue
+                left_ms = int((deadline - time.monotonic()) * 1000)
+                if left_ms <= 0:
+                    break
+                t.wait(left_ms)
+            except Exception:
+                pass
+
+        self._threads = {t for t in self._threads if t.isRunning()}
@@ -1,10 +1,49 @@
+import math
 import socket
 import threading
 import time
-import queue
 import numpy as np
 import sounddevice as sd
 
+try:
+    # Опционально: нужен libopus в системе. Без него голос идёт сырым PCM.
+    import opuslib
+except Exception:
+    opuslib = None
+
+# sendmsg (scatter-gather) есть не везде: на Windows — склейка заголовка и кадра.
+_HAS_SENDMSG = hasattr(socket.socket, "sendmsg")
+
+# Все метки времени VoiceClient — time.monotonic_ns(): целые и не прыгают
+# при переводе системных часов. Окна в наносекундах:
+_SPEAKING_HOLD_NS = 350_000_000
+_PLC_MAX_GAP_NS = 120_000_000
+_PING_TTL_NS = 5_000_000_000
+# Декодер Opus отправителя, от которого столько не было D|-кадров, удаляется.
+_OPUS_DEC_IDLE_NS = 3_000_000_000
+
+# Ёмкость джиттер-буфера воспроизведения, кадров по 20 мс.
+_PLAY_RING_FRAMES = 80
+
+# Битрейт Opus для голоса (бит/с): ~60 байт на 20-мс кадр вместо 640 байт PCM.
+_OPUS_BITRATE = 24000
+
+
+def _sum_sq_i16(samples, scratch=None) -> int:
+    """Сумма квадратов отсчётов int16 — целочисленно, одним проходом dot.
+
+    int64, потому что 320 * 32768**2 не помещается в int32. scratch —
+    заранее выделенный int64-буфер потока-вызывающего: при совпадении
+    размера расширение идёт в него, без новой аллокации на кадр.
+    """
+    flat = samples.reshape(-1)
+    if scratch is not None and scratch.size == flat.size:
+        np.copyto(scratch, flat)
+        a = scratch
+    else:
+        a = flat.astype(np.int64)
+    return int(np.dot(a, a))
+
 
 class VoiceClient:
     def __init__(self, login, token: str = "", host="127.0.0.1", port=5556):
@@ -13,13 +52,19 @@ class VoiceClient:
         self.host = host
         self.port = port
         self.running = False
+        # stop() может прийти одновременно из UI и из фонового потока остановки.
+        self._state_lock = threading.Lock()
         self.sock = None
         self.sample_rate = 16000
         self.channels = 1
         self.dtype = "int16"
         self.frame_samples = 320
-        # Короткий джиттер-буфер для сглаживания неровной UDP-доставки.
-        self.play_q = queue.Queue(maxsize=80)
+        # Короткий джиттер-буфер для сглаживания неровной UDP-доставки:
+        # SPSC-кольцо заранее выделенных кадров. Пишет только _recv_loop (_play_head),
+        # читает только PortAudio-callback (_play_tail) — без локов в аудиопотоке.
+        self._play_ring = np.zeros((_PLAY_RING_FRAMES, self.frame_samples), dtype=np.int16)
+        self._play_head = 0
+        self._play_tail = 0
         self.recv_thread = None
         self.heartbeat_thread = None
         self.in_stream = None
@@ -29,24 +74,47 @@ class VoiceClient:
         self.mic_enabled = True
         self.sound_enabled = True
 
+        # Opus: кодек создаётся в start(), если доступен opuslib. Кодировать
+        # разрешает сервер ответом "K|1" — когда все получатели умеют Opus.
+        self._opus_enc = None
+        # Декодер хранит состояние между кадрами — свой на каждого отправителя:
+        # from_user (bytes) -> [opuslib.Decoder, monotonic_ns последнего кадра].
+        self._opus_decs = {}
+        self._opus_decs_swept_ns = 0
+        self._send_opus = False
+        self._pcm_header = b""
+        self._opus_header = b""
+        self._addr = (host, port)
+
         # Playback/buffer state
         self._target_buffer_frames = 3
-        self._last_play_chunk = b""
+        # Слот кольца с последним сыгранным кадром для PLC (повтор при коротком
+        # опоздании пакета); -1 — ещё ничего не играли. PLC срабатывает только
+        # при пустом кольце, а тогда писатель следующим пишет другой слот.
+        self._last_play_slot = -1
         self._underflow_score = 0.0
         self._overflow_score = 0.0
 
         # speaking/activity metrics
         self._mic_level = 0.0
         self._peer_level = 0.0
-        self._last_mic_voice_ts = 0.0
-        self._last_peer_voice_ts = 0.0
-        self._last_recv_ts = 0.0
+        self._last_mic_voice_ts = 0
+        self._last_peer_voice_ts = 0
+        self._last_recv_ts = 0
         self._jitter_ms = 0.0
         self._avg_gap_ms = 20.0
         self._loss_score = 0.0
+        # [count, gap_sum, dev_sum, miss_sum]: пишет _recv_loop, забирает GUI-поток.
+        self._gap_lock = threading.Lock()
+        self._gap_acc = [0, 0.0, 0.0, 0.0]
         self._latency_ms = 0.0
         self._ping_sent = {}
         self._voice_threshold = 0.015
+        # Тот же порог в единицах int16**2 на отсчёт: VAD сравнивает без float.
+        self._vad_ss_per_sample = (self._voice_threshold * 32768.0) ** 2
+        # int64-буферы для _sum_sq_i16: свой у аудио-callback и у _recv_loop.
+        self._mic_ss_scratch = np.empty(self.frame_samples, dtype=np.int64)
+        self._peer_ss_scratch = np.empty(self.frame_samples, dtype=np.int64)
 
         # quality metrics / ping
         self._ping_thread = None
@@ -73,6 +141,15 @@ class VoiceClient:
             pass
         self.sock.settimeout(0.2)
         self._reset_runtime_metrics()
+        # Адрес сервера резолвим один раз: sendto с именем хоста резолвит на каждый пакет.
+        try:
+            self._addr = socket.getaddrinfo(self.host, self.port, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+        except OSError:
+            self._addr = (self.host, self.port)
+        login_b = str(self.login).encode("utf-8")
+        self._pcm_header = b"A|" + login_b + b"|"
+        self._opus_header = b"O|" + login_b + b"|"
+        self._init_opus()
         self._join()
         if self.room_id:
             self._join_room(self.room_id)
@@ -105,9 +182,10 @@ class VoiceClient:
         self.out_stream.start()
 
     def stop(self):
-        if not self.running:
-            return
-        self.running = False
+        with self._state_lock:
+            if not self.running:
+                return
+            self.running = False
         try:
             if self.peer:
                 self._set_pair(self.login, self.peer, False)
@@ -136,45 +214,103 @@ class VoiceClient:
         self.room_id = None
         self.mic_enabled = True
         self.sound_enabled = True
+        self._opus_enc = None
+        self._opus_decs = {}
+        self._send_opus = False
         self._mic_level = 0.0
         self._peer_level = 0.0
-        self._last_mic_voice_ts = 0.0
-        self._last_peer_voice_ts = 0.0
-        self._last_recv_ts = 0.0
+        self._last_mic_voice_ts = 0
+        self._last_peer_voice_ts = 0
+        self._last_recv_ts = 0
         self._jitter_ms = 0.0
         self._avg_gap_ms = 20.0
         self._loss_score = 0.0
+        with self._gap_lock:
+            self._gap_acc = [0, 0.0, 0.0, 0.0]
         self._latency_ms = 0.0
         self._ping_sent = {}
         self._underflow_score = 0.0
         self._overflow_score = 0.0
-        self._last_play_chunk = b""
-        with self.play_q.mutex:
-            self.play_q.queue.clear()
+        self._clear_play_ring()
+
+    def _clear_play_ring(self):
+        # Вызывается, когда аудио-callback и _recv_loop не работают (до старта / после stop).
+        self._play_head = 0
+        self._play_tail = 0
+        self._last_play_slot = -1
+
+    def _buffered_frames(self) -> int:
+        return max(0, self._play_head - self._play_tail)
 
     def _reset_runtime_metrics(self):
         self._mic_level = 0.0
         self._peer_level = 0.0
-        self._last_mic_voice_ts = 0.0
-        self._last_peer_voice_ts = 0.0
-        self._last_recv_ts = 0.0
+        self._last_mic_voice_ts = 0
+        self._last_peer_voice_ts = 0
+        self._last_recv_ts = 0
         self._jitter_ms = 0.0
         self._avg_gap_ms = 20.0
         self._loss_score = 0.0
+        with self._gap_lock:
+            self._gap_acc = [0, 0.0, 0.0, 0.0]
         self._latency_ms = 0.0
         self._ping_sent = {}
         self._underflow_score = 0.0
         self._overflow_score = 0.0
-        self._last_play_chunk = b""
-        with self.play_q.mutex:
-            self.play_q.queue.clear()
+        self._clear_play_ring()
+
+    def _init_opus(self):
+        self._opus_enc = None
+        self._opus_decs = {}
+        self._send_opus = False
+        if opuslib is None:
+            return
+        try:
+            enc = opuslib.Encoder(self.sample_rate, self.channels, opuslib.APPLICATION_VOIP)
+            enc.bitrate = _OPUS_BITRATE
+            # Проба: декодеры создаются в _decode_opus по одному на отправителя.
+            opuslib.Decoder(self.sample_rate, self.channels)
+            self._opus_enc = enc
+        except Exception:
+            self._opus_enc = None
+
+    def _decode_opus(self, sender: bytes, frame: bytes):
+        """Декодировать D|-кадр декодером его отправителя; None — кадр пропустить.
+
+        Сервер об уходе участника не сообщает, поэтому декодеры отправителей,
+        молчащих дольше _OPUS_DEC_IDLE_NS, удаляются при очередном кадре.
+        """
+        now = time.monotonic_ns()
+        decs = self._opus_decs
+        if now - self._opus_decs_swept_ns > _OPUS_DEC_IDLE_NS:
+            self._opus_decs_swept_ns = now
+            for k in [k for k, ent in decs.items() if now - ent[1] > _OPUS_DEC_IDLE_NS]:
+                del decs[k]
+        ent = decs.get(sender)
+        if ent is None:
+            try:
+                ent = decs[sender] = [opuslib.Decoder(self.sample_rate, self.channels), now]
+            except Exception:
+                return None
+        ent[1] = now
+        try:
+            return ent[0].decode(frame, self.frame_samples)
+        except Exception:
+            return None
+
+    def _announce_codecs(self):
+        # Старый сервер пакет K| игнорирует и не отвечает — остаёмся на PCM.
+        if self._opus_enc is None:
+            return
+        msg = b"K|" + str(self.login).encode("utf-8") + b"|opus"
+        self.sock.sendto(msg, self._addr)
 
     def _join(self):
         if self.token:
             msg = f"J|{self.login}|{self.token}".encode("utf-8")
         else:
             msg = f"J|{self.login}".encode("utf-8")
-        self.sock.sendto(msg, (self.host, self.port))
+        self.sock.sendto(msg, self._addr)
 
     def _join_room(self, room_id: str):
         room = str(room_id or "").strip()
@@ -182,14 +318,14 @@ class VoiceClient:
             return
         token_part = self.token or ""
         msg = f"C|{self.login}|{token_part}|{room}".encode("utf-8")
-        self.sock.sendto(msg, (self.host, self.port))
+        self.sock.sendto(msg, self._addr)
 
     def _leave_room(self, room_id: str):
         room = str(room_id or "").strip()
         if not room:
             return
         msg = f"L|{self.login}|{room}".encode("utf-8")
-        self.sock.sendto(msg, (self.host, self.port))
+        self.sock.sendto(msg, self._addr)
 
     def _set_pair(self, a, b, active):
         flag = "1" if active else "0"
@@ -199,7 +335,7 @@ class VoiceClient:
             msg = f"S|{self.login}|{self.token}|{a}|{b}|{flag}".encode("utf-8")
         else:
             msg = f"S|{a}|{b}|{flag}".encode("utf-8")
-        self.sock.sendto(msg, (self.host, self.port))
+        self.sock.sendto(msg, self._addr)
 
     def _heartbeat_loop(self):
         while self.running:
@@ -207,6 +343,7 @@ class VoiceClient:
                 self._join()
                 if self.room_id:
                     self._join_room(self.room_id)
+                self._announce_codecs()
             except Exception:
                 pass
             time.sleep(2)
@@ -217,10 +354,11 @@ class VoiceClient:
                 seq = self._ping_seq
                 self._ping_seq += 1
                 payload = f"{seq}|{time.time():.6f}".encode("utf-8")
-                self._ping_sent[seq] = time.time()
-                self.sock.sendto(b"P|" + payload, (self.host, self.port))
+                self._ping_sent[seq] = time.monotonic_ns()
+                self.sock.sendto(b"P|" + payload, self._addr)
                 # cleanup old
-                old = [k for k,v in self._ping_sent.items() if time.time()-v>5]
+                now_ns = time.monotonic_ns()
+                old = [k for k, v in self._ping_sent.items() if now_ns - v > _PING_TTL_NS]
                 for k in old:
                     self._ping_sent.pop(k, None)
             except Exception:
@@ -231,20 +369,26 @@ class VoiceClient:
         if not self.running:
             return
         try:
-            arr = indata.astype(np.float32)
-            rms = float(np.sqrt(np.mean(np.square(arr)))) if arr.size else 0.0
-            self._mic_level = rms
-            if rms >= self._voice_threshold:
-                self._last_mic_voice_ts = time.time()
+            n = indata.size
+            if n:
+                ss = _sum_sq_i16(indata, self._mic_ss_scratch)
+                self._mic_level = math.sqrt(ss / n) / 32768.0
+                if ss >= self._vad_ss_per_sample * n:
+                    self._last_mic_voice_ts = time.monotonic_ns()
         except Exception:
             pass
 
         if not self.mic_enabled:
             return
         try:
-            pcm = indata.copy().tobytes()
-            header = f"A|{self.login}|".encode("utf-8")
-            self.sock.sendto(header + pcm, (self.host, self.port))
+            enc = self._opus_enc
+            if self._send_opus and enc is not None:
+                self.sock.sendto(self._opus_header + enc.encode(indata.tobytes(), frames), self._addr)
+            elif _HAS_SENDMSG and indata.flags.c_contiguous:
+                # Заголовок и буфер кадра уходят одним iovec, без промежуточной склейки.
+                self.sock.sendmsg((self._pcm_header, indata), (), 0, self._addr)
+            else:
+                self.sock.sendto(self._pcm_header + indata.tobytes(), self._addr)
         except Exception:
             pass
 
@@ -253,38 +397,34 @@ class VoiceClient:
             outdata[:] = 0
             return
         try:
+            head = self._play_head
+            tail = self._play_tail
             # Небольшой prebuffer для устойчивости к джиттеру сети.
-            if self.play_q.qsize() < self._target_buffer_frames and self._last_recv_ts > 0:
+            if head - tail < self._target_buffer_frames and self._last_recv_ts > 0:
                 outdata[:] = 0
                 self._underflow_score = min(100.0, self._underflow_score * 0.97 + 2.5)
                 return
 
-            chunk = self.play_q.get_nowait()
-            self._last_play_chunk = chunk
-            arr = np.frombuffer(chunk, dtype=np.int16).reshape(-1, 1)
-            if len(arr) < len(outdata):
-                outdata[:] = 0
-                outdata[:len(arr)] = arr
-            else:
-                outdata[:] = arr[:len(outdata)]
+            if head > tail:
+                # Писатель ушёл дальше ёмкости кольца — пропускаем самые старые кадры,
+                # чтобы держать задержку низкой (и не читать слот, который он пишет).
+                if head - tail > _PLAY_RING_FRAMES - 2:
+                    tail = head - (_PLAY_RING_FRAMES - 2)
+                slot = tail % _PLAY_RING_FRAMES
+                self._write_frame(outdata, self._play_ring[slot])
+                self._last_play_slot = slot
+                self._play_tail = tail + 1
+
+                # плавно снижаем штрафы при стабильном воспроизведении
+                self._underflow_score = max(0.0, self._underflow_score * 0.96 - 0.2)
+                self._overflow_score = max(0.0, self._overflow_score * 0.97 - 0.2)
+                return
 
-            # плавно снижаем штрафы при стабильном воспроизведении
-            self._underflow_score = max(0.0, self._underflow_score * 0.96 - 0.2)
-            self._overflow_score = max(0.0, self._overflow_score * 0.97 - 0.2)
-        except queue.Empty:
             # Простая PLC-логика: кратковременно повторяем последний фрейм,
             # если пакет задержался совсем немного.
-            now_ts = time.time()
-            if self._last_play_chunk and self._last_recv_ts > 0 and (now_ts - self._last_recv_ts) < 0.12:
-                try:
-                    arr = np.frombuffer(self._last_play_chunk, dtype=np.int16).reshape(-1, 1)
-                    if len(arr) < len(outdata):
-                        outdata[:] = 0
-                        outdata[:len(arr)] = arr
-                    else:
-                        outdata[:] = arr[:len(outdata)]
-                except Exception:
-                    outdata[:] = 0
+            last = self._last_play_slot
+            if last >= 0 and self._last_recv_ts > 0 and (time.monotonic_ns() - self._last_recv_ts) < _PLC_MAX_GAP_NS:
+                self._write_frame(outdata, self._play_ring[last])
             else:
                 outdata[:] = 0
             self._underflow_score = min(100.0, self._underflow_score * 0.97 + 3.0)
@@ -292,63 +432,102 @@ class VoiceClient:
             outdata[:] = 0
             self._underflow_score = min(100.0, self._underflow_score * 0.98 + 1.5)
 
+    @staticmethod
+    def _write_frame(outdata, frame):
+        # outdata — C-непрерывный (frames, 1) int16: плоский вид и одно копирование.
+        flat = outdata.reshape(-1)
+        n = min(flat.size, frame.size)
+        flat[:n] = frame[:n]
+        if n < flat.size:
+            flat[n:] = 0
+
     def _recv_loop(self):
+        # Один буфер на весь поток: датаграммы читаются в него без аллокаций,
+        # PCM копируется в кольцо воспроизведения до следующего чтения.
+        buf = bytearray(8192)
+        view = memoryview(buf)
         while self.running:
             try:
-                data, _ = self.sock.recvfrom(8192)
+                size, _ = self.sock.recvfrom_into(buf)
             except socket.timeout:
                 continue
             except Exception:
                 break
 
-            if data.startswith(b"Q|"):
+            if size < 3:
+                continue
+            typ = buf[:2]
+            if typ == b"Q|":
                 try:
-                    payload = data[2:].decode("utf-8", errors="ignore")
+                    payload = bytes(view[2:size]).decode("utf-8", errors="ignore")
                     seq_s, _ts = payload.split("|", 1)
                     seq = int(seq_s)
                     sent = self._ping_sent.pop(seq, None)
                     if sent is not None:
-                        self._latency_ms = max(0.0, (time.time() - sent) * 1000.0)
+                        self._latency_ms = max(0.0, (time.monotonic_ns() - sent) / 1e6)
                 except Exception:
                     pass
                 continue
 
-            if not data.startswith(b"R|"):
+            if typ == b"K|":
+                self._send_opus = buf[2:3] == b"1" and self._opus_enc is not None
+                continue
+
+            if typ != b"R|" and typ != b"D|":
                 continue
-            sep = data.find(b"|", 2)
+            sep = buf.find(b"|", 2, size)
             if sep == -1:
                 continue
-            pcm = data[sep + 1:]
-            now_ts = time.time()
+            pcm = view[sep + 1:size]
+            if typ == b"D|":
+                if self._opus_enc is None:
+                    continue
+                pcm = self._decode_opus(bytes(view[2:sep]), bytes(pcm))
+                if pcm is None:
+                    continue
+            elif self._opus_decs:
+                # Отправитель перешёл на PCM: состояние его декодера устарело.
+                self._opus_decs.pop(bytes(view[2:sep]), None)
+            now_ts = time.monotonic_ns()
             if self._last_recv_ts > 0:
-                gap_ms = (now_ts - self._last_recv_ts) * 1000.0
-                dev = abs(gap_ms - 20.0)
-                self._avg_gap_ms = 0.95 * self._avg_gap_ms + 0.05 * gap_ms
-                self._jitter_ms = 0.9 * self._jitter_ms + 0.1 * dev
+                # Только накопление; сглаживание — в get_activity (_fold_gap_stats).
+                gap_ms = (now_ts - self._last_recv_ts) / 1e6
                 # rough loss proxy: big gaps
-                miss = max(0.0, (gap_ms - 35.0) / 20.0)
-                self._loss_score = min(100.0, 0.9 * self._loss_score + 10.0 * miss)
+                miss = (gap_ms - 35.0) / 20.0 if gap_ms > 35.0 else 0.0
+                with self._gap_lock:
+                    acc = self._gap_acc
+                    acc[0] += 1
+                    acc[1] += gap_ms
+                    acc[2] += abs(gap_ms - 20.0)
+                    acc[3] += miss
             self._last_recv_ts = now_ts
 
             try:
-                arr = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
-                rms = float(np.sqrt(np.mean(np.square(arr)))) if arr.size else 0.0
-                self._peer_level = rms
-                if rms >= self._voice_threshold:
-                    self._last_peer_voice_ts = time.time()
+                samples = np.frombuffer(pcm, dtype=np.int16)
+            except ValueError:
+                continue
+            n = samples.size
+            if not n:
+                continue
+            try:
+                ss = _sum_sq_i16(samples, self._peer_ss_scratch)
+                self._peer_level = math.sqrt(ss / n) / 32768.0
+                if ss >= self._vad_ss_per_sample * n:
+                    self._last_peer_voice_ts = time.monotonic_ns()
             except Exception:
                 pass
-            try:
-                self.play_q.put_nowait(pcm)
-            except queue.Full:
-                try:
-                    # При переполнении сбрасываем самый старый кадр,
-                    # чтобы держать задержку низкой.
-                    _ = self.play_q.get_nowait()
-                    self.play_q.put_nowait(pcm)
-                    self._overflow_score = min(100.0, self._overflow_score * 0.96 + 2.0)
-                except Exception:
-                    pass
+
+            # Кадр копируется в свой слот кольца; короткий дополняется тишиной.
+            head = self._play_head
+            slot = self._play_ring[head % _PLAY_RING_FRAMES]
+            m = min(n, self.frame_samples)
+            slot[:m] = samples[:m]
+            if m < self.frame_samples:
+                slot[m:] = 0
+            if head - self._play_tail >= _PLAY_RING_FRAMES - 2:
+                # Переполнение: старые кадры отбросит читатель (см. _play_cb).
+                self._overflow_score = min(100.0, self._overflow_score * 0.96 + 2.0)
+            self._play_head = head + 1
 
     def set_mic_enabled(self, enabled: bool):
         self.mic_enabled = bool(enabled)
@@ -356,10 +535,29 @@ class VoiceClient:
     def set_sound_enabled(self, enabled: bool):
         self.sound_enabled = bool(enabled)
 
+    def _fold_gap_stats(self):
+        """Свернуть накопленные с прошлого вызова интервалы в EWMA-метрики.
+
+        k пакетов с одинаковым средним дают тот же результат, что k шагов
+        EWMA по одному пакету (для loss — с потолком 100 на всю пачку).
+        """
+        with self._gap_lock:
+            acc, self._gap_acc = self._gap_acc, [0, 0.0, 0.0, 0.0]
+        k = acc[0]
+        if not k:
+            return
+        w_gap = 1.0 - 0.95 ** k
+        w = 1.0 - 0.9 ** k
+        self._avg_gap_ms += w_gap * (acc[1] / k - self._avg_gap_ms)
+        self._jitter_ms += w * (acc[2] / k - self._jitter_ms)
+        # шаг 0.9*s + 10*miss сходится к 100*miss
+        self._loss_score = min(100.0, self._loss_score + w * (100.0 * acc[3] / k - self._loss_score))
+
     def get_activity(self):
-        now = time.time()
-        me = (now - self._last_mic_voice_ts) < 0.35 if self.mic_enabled else False
-        peer = (now - self._last_peer_voice_ts) < 0.35 if self.sound_enabled else False
+        self._fold_gap_stats()
+        now = time.monotonic_ns()
+        me = (now - self._last_mic_voice_ts) < _SPEAKING_HOLD_NS if self.mic_enabled else False
+        peer = (now - self._last_peer_voice_ts) < _SPEAKING_HOLD_NS if self.sound_enabled else False
         # quality bucket
         jitter = float(self._jitter_ms)
         latency = float(self._latency_ms)
@@ -389,7 +587,7 @@ class VoiceClient:
             "peer_speaking": peer,
             "latency_ms": round(latency, 1),
             "jitter_ms": round(jitter, 1),
-            "buffer_frames": int(self.play_q.qsize()),
+            "buffer_frames": self._buffered_frames(),
             "quality": quality,
             "quality_score": round(max(0.0, min(100.0, score)), 1),
         }
@@ -6,6 +6,7 @@ import json
 import os
 import secrets
 import socket
+import select
 import sqlite3
 import struct
 import random
@@ -44,6 +45,9 @@ EVENT_MAX_PER_USER = 200
 EVENT_TTL_SEC = 180
 CALL_STALE_SEC = 25  # if one side stops sending heartbeats/polls, auto-release call
 
+# read-only / keepalive actions a client may coalesce into one poll_batch request
+POLL_BATCH_ACTIONS = {"heartbeat", "status", "get_my_channel_invites", "poll_events"}
+
 active_calls: Dict[str, str] = {}  # user -> peer
 call_activity: Dict[str, float] = {}  # user -> monotonic ts of last call-related activity
 call_lock = threading.Lock()
@@ -51,10 +55,19 @@ call_lock = threading.Lock()
 # per user event queue
 pending_events: Dict[str, deque] = defaultdict(lambda: deque(maxlen=EVENT_MAX_PER_USER))
 events_lock = threading.Lock()
+# notified on every push_event so subscribe connections wake up immediately
+events_cond = threading.Condition(events_lock)
+SUBSCRIBE_KEEPALIVE_SEC = 10  # must stay below CALL_STALE_SEC
+LONG_POLL_MAX_WAIT_SEC = 20  # must stay below CALL_STALE_SEC
+# idle limit for request connections opened with "keep_alive": true
+REQUEST_KEEPALIVE_IDLE_SEC = 60
 
 # session touch throttling to avoid sqlite write storms with multiple windows
 _session_touch_cache: Dict[str, float] = {}
 _session_touch_lock = threading.Lock()
+# tokens put offline by presence_offline/shutdown_bundle; subscriptions must not
+# touch them back online until the client makes a new authenticated request
+_offline_tokens: set = set()
 
 
 # -------------------- Password hashing --------------------
@@ -101,14 +114,24 @@ def maybe_upgrade_legacy_password(conn: sqlite3.Connection, login: str, stored:
 
 # -------------------- Protocol (length‑prefix) --------------------
 
+_RECV_CHUNK = 64 * 1024
+
+
 def _recv_exact(conn: socket.socket, n: int) -> bytes:
-    buf = b""
-    while len(buf) < n:
-        chunk = conn.recv(n - len(buf))
-        if not chunk:
+    # The length comes from an unauthenticated header, so the buffer grows
+    # with the bytes actually received (at most _RECV_CHUNK ahead) instead of
+    # being sized to n up front; recv_into still avoids re-copying per recv.
+    buf = bytearray(min(n, _RECV_CHUNK))
+    got = 0
+    while got < n:
+        if got == len(buf):
+            buf.extend(bytes(min(n - got, _RECV_CHUNK)))
+        with memoryview(buf) as view:
+            k = conn.recv_into(view[got:], len(buf) - got)
+        if not k:
             return b""
-        buf += chunk
-    return buf
+        got += k
+    return bytes(buf)
 
 
 def recv_request(conn: socket.socket, max_bytes: int = 10_000_000) -> Optional[Dict[str, Any]]:
@@ -149,8 +172,19 @@ def recv_request(conn: socket.socket, max_bytes: int = 10_000_000) -> Optional[D
         return None
 
 
+def peer_closed(conn: socket.socket) -> bool:
+    """True if the client has closed (EOF) or reset the connection; never blocks."""
+    try:
+        readable, _, _ = select.select([conn], [], [], 0)
+        if not readable:
+            return False
+        return conn.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        return True
+
+
 def send_response(conn: socket.socket, obj: Dict[str, Any]) -> None:
-    payload = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    payload = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
     conn.sendall(struct.pack("!I", len(payload)) + payload)
 
 
@@ -429,6 +463,7 @@ def delete_session(token: str) -> None:
     finally:
         with _session_touch_lock:
             _session_touch_cache.pop(token, None)
+            _offline_tokens.discard(token)
 
 
 def set_session_offline(token: str) -> None:
@@ -451,6 +486,12 @@ def set_session_offline(token: str) -> None:
         # allow immediate future touch updates after app relaunch/login resume
         with _session_touch_lock:
             _session_touch_cache.pop(token, None)
+            _offline_tokens.add(token)
+
+
+def is_session_marked_offline(token: str) -> bool:
+    with _session_touch_lock:
+        return token in _offline_tokens
 
 
 def is_online(login: str) -> bool:
@@ -481,6 +522,9 @@ def require_auth(data: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Op
     if not sess:
         return None, None, {"status": "error", "code": "session_invalid", "message": "Сессия недействительна. Войдите заново."}
     touch_session(token)
+    # a fresh authenticated request means the client is back
+    with _session_touch_lock:
+        _offline_tokens.discard(token)
     return sess.get("login"), token, None
 
 
@@ -491,8 +535,9 @@ def push_event(login: str, event: Dict[str, Any]) -> None:
         return
     ev = dict(event)
     ev.setdefault("ts", _iso(_now_utc()))
-    with events_lock:
+    with events_cond:
         pending_events[login].append(ev)
+        events_cond.notify_all()
 
 
 def pop_events(login: str) -> list:
@@ -520,6 +565,37 @@ def pop_events(login: str) -> list:
     return out
 
 
+def wait_events(login: str, timeout: float) -> bool:
+    """Block until the user has pending events (or timeout); does not pop them.
+
+    The caller pops only once it knows it can still deliver them.
+    """
+    if not login:
+        return False
+    with events_cond:
+        return events_cond.wait_for(lambda: bool(pending_events.get(login)), timeout=timeout)
+
+
+def requeue_events(login: str, events: list) -> None:
+    """Put undelivered events back at the front of the user's queue, in order."""
+    if not login or not events:
+        return
+    with events_cond:
+        pending_events[login].extendleft(reversed(events))
+        events_cond.notify_all()
+
+
+def push_invite_count(login: str) -> None:
+    """Queue the user's current pending channel invite count (badge delta)."""
+    push_event(login, {"type": "invite_delta", "count": len(get_incoming_channel_invites(login))})
+
+
+def push_unread_counts(login: str) -> None:
+    """Queue the user's per-chat unread counts and total (badge delta)."""
+    counts = get_unread_counts(login)
+    push_event(login, {"type": "unread_delta", "counts": counts, "total": sum(counts.values())})
+
+
 # -------------------- User operations --------------------
 
 def user_exists(login: str) -> bool:
@@ -1827,9 +1903,18 @@ def handle_request(data: Dict[str, Any]) -> Dict[str, Any]:
         info["online"] = is_online(target_login)
         return {"status": "ok", **info}
 
+    if action == "poll_batch":
+        # Several periodic polls in one round-trip; each item reuses its own handler.
+        results = {}
+        for item in data.get("items") or []:
+            if item in POLL_BATCH_ACTIONS and item not in results:
+                results[item] = handle_request({**data, "action": item})
+        return {"status": "ok", "results": results}
+
     if action == "heartbeat":
         mark_call_activity(current_user)
-        return {"status": "ok"}
+        # presence is included so clients need no separate "status" poll
+        return {"status": "ok", "login": current_user, "online": is_online(current_user)}
 
     if action == "logout":
         # End active call (if any)
@@ -1848,6 +1933,14 @@ def handle_request(data: Dict[str, Any]) -> Dict[str, Any]:
         set_session_offline(token)
         return {"status": "ok"}
 
+    if action == "shutdown_bundle":
+        # App close in one packet: release_call_state + presence_offline.
+        if data.get("release_call", True):
+            cleanup_calls_for_user(current_user)
+        if data.get("set_offline", True):
+            set_session_offline(token)
+        return {"status": "ok"}
+
     if action == "status":
         # status for the current user only
         return {"status": "ok", "login": current_user, "online": is_online(current_user)}
@@ -1908,6 +2001,7 @@ def handle_request(data: Dict[str, Any]) -> Dict[str, Any]:
         if not to_user or not text:
             return {"status": "error", "message": "Пустое сообщение"}
         save_message(current_user, to_user, text)
+        push_unread_counts(to_user)
         return {"status": "ok"}
 
     if action == "get_messages":
@@ -1925,6 +2019,8 @@ def handle_request(data: Dict[str, Any]) -> Dict[str, Any]:
         if not friend:
             return {"status": "error", "message": "Не указан собеседник"}
         mark_chat_read(current_user, friend)
+        # other windows of the same user drop the badge too
+        push_unread_counts(current_user)
         return {"status": "ok"}
 
     if action == "get_unread_counts":
@@ -1959,6 +2055,8 @@ def handle_request(data: Dict[str, Any]) -> Dict[str, Any]:
         channel_id = int(data.get("channel_id") or 0)
         to_user = (data.get("to_user") or "").strip()
         ok, msg = send_channel_invite(current_user, channel_id, to_user)
+        if ok:
+            push_invite_count(to_user)
         return {"status": "ok"} if ok else {"status": "error", "message": msg}
 
     if action == "get_my_channel_invites":
@@ -1973,6 +2071,7 @@ def handle_request(data: Dict[str, Any]) -> Dict[str, Any]:
         ok, msg, ch = respond_channel_invite(current_user, invite_id, accept=(decision == "accept"))
         if not ok:
             return {"status": "error", "message": msg}
+        push_invite_count(current_user)
         return {"status": "ok", "channel": ch} if ch else {"status": "ok"}
 
     if action == "get_channel_messages":
@@ -2088,6 +2187,18 @@ def handle_request(data: Dict[str, Any]) -> Dict[str, Any]:
         events = pop_events(current_user)
         return {"status": "ok", "events": events}
 
+    if action == "poll_events_long":
+        # Completes as soon as events arrive or after max_wait_ms; the wait is
+        # capped below CALL_STALE_SEC so the call stays marked active.
+        try:
+            max_wait = float(data.get("max_wait_ms") or 0) / 1000.0
+        except (TypeError, ValueError):
+            max_wait = 0.0
+        max_wait = max(0.0, min(max_wait, LONG_POLL_MAX_WAIT_SEC))
+        mark_call_activity(current_user)
+        wait_events(current_user, max_wait)
+        return {"status": "ok", "events": pop_events(current_user)}
+
     if action == "accept_call":
         from_user = (data.get("from_user") or "").strip()
         ok = accept_call(current_user, from_user)
@@ -2103,19 +2214,75 @@ def handle_request(data: Dict[str, Any]) -> Dict[str, Any]:
         ok = end_call(current_user, with_user)
         return {"status": "ok"} if ok else {"status": "error", "message": "Нет активного вызова"}
 
-    return {"status": "error", "message": "Неизвестное действие"}
+    return {"status": "error", "code": "unknown_action", "message": "Неизвестное действие"}
 
 
 # -------------------- Server loop --------------------
 
+def serve_subscription(conn: socket.socket, data: Dict[str, Any]) -> None:
+    """Long-lived push channel: events are written to the socket as they arrive.
+
+    The connection doubles as call-activity keepalive, so a subscribed client
+    does not need to poll poll_events at all.
+    """
+    current_user, token, err = require_auth(data)
+    if err:
+        send_response(conn, err)
+        return
+    send_response(conn, {"status": "ok", "type": "subscribed"})
+    while True:
+        if not get_session_by_token(token):
+            send_response(conn, {"status": "error", "code": "session_invalid", "message": "Сессия недействительна"})
+            return
+        # the client may have gone away (app close) while we were waiting
+        if peer_closed(conn):
+            return
+        # an open subscription keeps the session online even when the
+        # client throttles its heartbeat in background, but must not undo
+        # an explicit presence_offline/shutdown_bundle
+        if not is_session_marked_offline(token):
+            touch_session(token)
+            mark_call_activity(current_user)
+        wait_events(current_user, SUBSCRIBE_KEEPALIVE_SEC)
+        # pop only for a live client: a dead subscriber must leave the events
+        # to a reconnected subscription or the poll_events fallback
+        if peer_closed(conn):
+            return
+        events = pop_events(current_user)
+        if not events:
+            send_response(conn, {"status": "ok", "type": "ping"})
+            continue
+        try:
+            send_response(conn, {"status": "ok", "type": "events", "events": events})
+        except OSError:
+            requeue_events(current_user, events)
+            return
+
+
 def handle_client(conn: socket.socket, addr):
     try:
         data = recv_request(conn)
         if not data:
             send_response(conn, {"status": "error", "message": "Пустой запрос"})
             return
-        resp = handle_request(data)
-        send_response(conn, resp)
+        if data.get("action") == "subscribe":
+            serve_subscription(conn, data)
+            return
+        # keep_alive clients reuse one connection for a sequence of requests;
+        # legacy clients still get exactly one response per connection
+        while data:
+            resp = handle_request(data)
+            # pipelining clients match replies to requests by req_id
+            if "req_id" in data and isinstance(resp, dict):
+                resp = dict(resp, req_id=data["req_id"])
+            send_response(conn, resp)
+            if not data.get("keep_alive"):
+                return
+            conn.settimeout(REQUEST_KEEPALIVE_IDLE_SEC)
+            try:
+                data = recv_request(conn)
+            except (socket.timeout, OSError):
+                return
     except Exception as e:
         try:
             send_response(conn, {"status": "error", "message": f"Ошибка сервера: {e}"})
@@ -2140,6 +2307,12 @@ def start_server(host: str = "0.0.0.0", port: int = 5555):
 
     while True:
         conn, addr = server.accept()
+        # keep-alive clients pipeline small requests; replies must not sit
+        # behind Nagle waiting for a delayed ACK
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
         t = threading.Thread(target=handle_client, args=(conn, addr), daemon=True)
         t.start()
 
@@ -30,11 +30,14 @@ room_members: Dict[str, set] = {}
 # login -> room_id(str)
 login_room: Dict[str, str] = {}
 
+# logins whose client announced an Opus decoder ("K|login|opus")
+opus_capable: set = set()
+
 lock = threading.Lock()
 
 _ROLE_RANK = {"member": 1, "moderator": 2, "admin": 3, "owner": 4}
 _CONTROL_RATE_WINDOW_SEC = 1.0
-_CONTROL_RATE_LIMIT = {b"J|": 30, b"C|": 30, b"L|": 30, b"S|": 40}
+_CONTROL_RATE_LIMIT = {b"J|": 30, b"C|": 30, b"L|": 30, b"S|": 40, b"K|": 30}
 _rate_lock = threading.Lock()
 _rate_log: Dict[Tuple[str, int, bytes], deque] = {}
 
@@ -263,16 +266,6 @@ def set_pair(a: str, b: str, active: bool):
             pairs.pop(key, None)
 
 
-def other_user_in_pair(me: str) -> Optional[str]:
-    with lock:
-        for key in pairs.keys():
-            if me in key:
-                for u in key:
-                    if u != me:
-                        return u
-    return None
-
-
 # -------------------- Cleanup --------------------
 
 def cleanup_loop(timeout_sec: int = 20):
@@ -286,6 +279,7 @@ def cleanup_loop(timeout_sec: int = 20):
 
             for login in dead:
                 clients.pop(login, None)
+                opus_capable.discard(login)
                 # remove reverse addr mapping
                 for k, v in list(addr_to_login.items()):
                     if v == login:
@@ -326,7 +320,16 @@ def handle_packet(sock: socket.socket, data: bytes, addr):
             if not ALLOW_INSECURE_JOIN:
                 return
 
+        audience = []
+        with lock:
+            prev = clients.get(login)
+            # a rejoin from a new address is a new client instance: its codec
+            # support is unknown until it sends K| again
+            if prev is not None and (prev[0], prev[1]) != (addr[0], addr[1]) and login in opus_capable:
+                opus_capable.discard(login)
+                audience = _audio_recipients(login)
         _mark_seen(login, addr)
+        _push_codec_state(sock, audience)
         return
 
     if typ == b"C|":
@@ -355,6 +358,8 @@ def handle_packet(sock: socket.socket, data: bytes, addr):
         _mark_seen(login, addr)
         with lock:
             _join_room(login, room_id)
+            members = list(room_members.get(room_id, ()))
+        _push_codec_state(sock, members)
         return
 
     if typ == b"L|":
@@ -428,6 +433,7 @@ def handle_packet(sock: socket.socket, data: bytes, addr):
                     return
 
             set_pair(a, b, flag == "1")
+            _push_codec_state(sock, (a, b))
         except Exception:
             pass
         return
@@ -440,58 +446,115 @@ def handle_packet(sock: socket.socket, data: bytes, addr):
             pass
         return
 
-    if typ == b"A|":
-        # Audio frame: A|from_user|<pcm>
+    if typ == b"K|":
+        # Codec capability: K|login|opus. The reply tells the sender whether every
+        # current recipient can decode Opus ("K|1") or it must keep sending PCM ("K|0").
+        payload = data[2:].decode("utf-8", errors="ignore").strip()
+        parts = payload.split("|")
+        login = parts[0].strip()
+        if not login or addr_to_login.get((addr[0], addr[1])) != login:
+            return
+        with lock:
+            was_capable = login in opus_capable
+            if "opus" in parts[1:]:
+                opus_capable.add(login)
+            else:
+                opus_capable.discard(login)
+            changed = was_capable != (login in opus_capable)
+            recips = _audio_recipients(login) if changed else []
+            ok = _opus_ok(login)
         try:
-            sep = data.find(b"|", 2)
-            if sep == -1:
-                return
+            sock.sendto(b"K|1" if ok else b"K|0", addr)
+        except Exception:
+            pass
+        # the others' verdict depends on this login's capability too
+        _push_codec_state(sock, recips)
+        return
 
-            from_user = data[2:sep].decode("utf-8", errors="ignore").strip()
-            pcm = data[sep + 1 :]
+    if typ == b"A|":
+        # Audio frame: A|from_user|<pcm>  ->  R|from_user|<pcm>
+        _relay_audio(sock, data, addr, b"R|", opus=False)
+        return
 
-            sender = addr_to_login.get((addr[0], addr[1]))
-            if sender != from_user:
-                return
+    if typ == b"O|":
+        # Opus frame: O|from_user|<opus>  ->  D|from_user|<opus> (only to Opus-capable clients)
+        _relay_audio(sock, data, addr, b"D|", opus=True)
 
-            _mark_seen(from_user, addr)
-
-            # 1) channel room broadcast
-            with lock:
-                room_id = login_room.get(from_user)
-                if room_id:
-                    recips = [u for u in room_members.get(room_id, set()) if u != from_user]
-                    targets = [clients.get(u) for u in recips]
-                else:
-                    targets = None
-
-            if targets is not None:
-                for tgt in targets:
-                    if not tgt:
-                        continue
-                    ip, port, _ = tgt
-                    try:
-                        sock.sendto(b"R|" + from_user.encode("utf-8") + b"|" + pcm, (ip, port))
-                    except Exception:
-                        pass
-                return
 
-            # 2) private pair
-            to_user = other_user_in_pair(from_user)
-            if not to_user:
-                return
+def _audio_recipients(from_user: str) -> list:
+    """Logins that hear from_user: its channel room, otherwise its private pair. Caller holds lock."""
+    room_id = login_room.get(from_user)
+    if room_id:
+        return [u for u in room_members.get(room_id, set()) if u != from_user]
+    for key in pairs.keys():
+        if from_user in key:
+            return [u for u in key if u != from_user]
+    return []
 
-            with lock:
-                target = clients.get(to_user)
-            if not target:
-                return
 
-            ip, port, _ = target
-            sock.sendto(b"R|" + from_user.encode("utf-8") + b"|" + pcm, (ip, port))
+def _opus_ok(login: str) -> bool:
+    """Whether login may send Opus: it and every current recipient decode it. Caller holds lock."""
+    recips = _audio_recipients(login)
+    return login in opus_capable and bool(recips) and all(u in opus_capable for u in recips)
+
+
+def _push_codec_state(sock: socket.socket, logins) -> None:
+    """Send the current K|1/K|0 verdict to the Opus-capable logins among `logins`.
+
+    Called when a room or pair changes. Otherwise a sender learns about a
+    PCM-only newcomer only from the reply to its next K| heartbeat, and its O|
+    frames are not relayed to that member in the meantime.
+    """
+    out = []
+    with lock:
+        for u in logins:
+            if u not in opus_capable:
+                continue
+            c = clients.get(u)
+            if c is None:
+                continue
+            out.append(((c[0], c[1]), b"K|1" if _opus_ok(u) else b"K|0"))
+    for target, msg in out:
+        try:
+            sock.sendto(msg, target)
         except Exception:
             pass
 
 
+def _relay_audio(sock: socket.socket, data: bytes, addr, out_typ: bytes, opus: bool):
+    try:
+        sep = data.find(b"|", 2)
+        if sep == -1:
+            return
+
+        from_user = data[2:sep].decode("utf-8", errors="ignore").strip()
+
+        sender = addr_to_login.get((addr[0], addr[1]))
+        if sender != from_user:
+            return
+
+        _mark_seen(from_user, addr)
+
+        with lock:
+            recips = _audio_recipients(from_user)
+            if opus:
+                recips = [u for u in recips if u in opus_capable]
+            targets = [clients.get(u) for u in recips]
+
+        # the frame already carries "from_user|<payload>": only the type prefix changes
+        out = out_typ + data[2:]
+        for tgt in targets:
+            if not tgt:
+                continue
+            ip, port, _ = tgt
+            try:
+                sock.sendto(out, (ip, port))
+            except Exception:
+                pass
+    except Exception:
+        pass
+
+
 def main():
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind((HOST, PORT))